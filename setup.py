@@ -52,12 +52,15 @@ setup(
     include_package_data=True,
     python_requires=">=3.7",
     install_requires=[
-        'setuptools',
         'funcparserlib>=1.0.0a0',
         'Pillow > 3.0',
         'webcolors',
+        'importlib_metadata; python_version < "3.8"',
     ],
     extras_require={
+        'numpy': [
+            'numpy'
+        ],
         'pdf': [
             'reportlab'
         ],
@@ -14,16 +14,20 @@
 #  limitations under the License.
 
 from blockdiag import parser
-from blockdiag.elements import Diagram, DiagramEdge, DiagramNode, NodeGroup
+from blockdiag.elements import BuildContext, Diagram, DiagramNode, NodeGroup
 from blockdiag.plugins import fire_node_event
 from blockdiag.utils import XY, unquote
 from blockdiag.utils.compat import cmp_to_key
 
 
 class DiagramTreeBuilder:
+    def __init__(self, context=None):
+        self.context = context or BuildContext()
+
     def build(self, tree, config):
         self.config = config
-        self.diagram = Diagram()
+        self.context.basedir = getattr(config, 'basedir', None)
+        self.diagram = self.context.Diagram()
         self.instantiate(self.diagram, tree)
         for subgroup in self.diagram.traverse_groups():
             if len(subgroup.nodes) == 0:
@@ -88,25 +92,26 @@ class DiagramTreeBuilder:
 
             # Instantiate statements
             if isinstance(stmt, parser.Node):
-                node = DiagramNode.get(stmt.id)
+                node = self.context.DiagramNode.get(stmt.id)
                 node.set_attributes(stmt.attrs)
                 self.belong_to(node, group)
 
             elif isinstance(stmt, parser.Edge):
-                from_nodes = [DiagramNode.get(n) for n in stmt.from_nodes]
-                to_nodes = [DiagramNode.get(n) for n in stmt.to_nodes]
+                get_node = self.context.DiagramNode.get
+                from_nodes = [get_node(n) for n in stmt.from_nodes]
+                to_nodes = [get_node(n) for n in stmt.to_nodes]
 
                 for node in from_nodes + to_nodes:
                     self.belong_to(node, group)
 
                 for node1 in from_nodes:
                     for node2 in to_nodes:
-                        edge = DiagramEdge.get(node1, node2)
+                        edge = self.context.DiagramEdge.get(node1, node2)
                         edge.set_dir(stmt.edge_type)
                         edge.set_attributes(stmt.attrs)
 
             elif isinstance(stmt, parser.Group):
-                subgroup = NodeGroup.get(stmt.id)
+                subgroup = self.context.NodeGroup.get(stmt.id)
                 subgroup.level = group.level + 1
                 self.belong_to(subgroup, group)
                 self.instantiate(subgroup, stmt)
@@ -117,7 +122,7 @@ class DiagramTreeBuilder:
             elif isinstance(stmt, parser.Extension):
                 if stmt.type == 'class':
                     name = unquote(stmt.name)
-                    Diagram.classes[name] = stmt
+                    self.context.classes[name] = stmt
                 elif stmt.type == 'plugin':
                     self.diagram.set_plugin(stmt.name, stmt.attrs,
                                             config=self.config)
@@ -131,25 +136,36 @@ class DiagramTreeBuilder:
     def bind_edges(self, group):
         for node in group.nodes:
             if isinstance(node, DiagramNode):
-                group.edges += DiagramEdge.find(node)
+                group.edges += self.context.DiagramEdge.find(node)
             else:
                 self.bind_edges(node)
 
 
 class DiagramLayoutManager:
-    def __init__(self, diagram):
+    max_circular_search = 10000  # steps to search circular paths
+
+    def __init__(self, diagram, context=None):
         self.diagram = diagram
+        self.context = context or diagram.context
+        if self.context is None:  # built from the plain element classes
+            if isinstance(diagram, Diagram):
+                self.context = BuildContext.wrap(diagram.__class__)
+            else:
+                self.context = BuildContext.wrap()
 
         self.circulars = []
         self.heightRefs = []
-        self.coordinates = []
+        self.coordinates = set()
+        self.column_heights = {}  # x -> the lowest marked y in the column
 
     def run(self):
         if isinstance(self.diagram, Diagram):
             for group in self.diagram.traverse_groups():
-                self.__class__(group).run()
+                self.__class__(group, self.context).run()
 
+        DiagramEdge = self.context.DiagramEdge
         self.edges = DiagramEdge.find_by_level(self.diagram.level)
+        self.index_edges()
         self.do_layout()
         self.diagram.fixiate()
 
@@ -180,18 +196,25 @@ class DiagramLayoutManager:
         for node in self.diagram.nodes:
             if node.xy.x == 0:
                 self.set_node_ypos(node, height)
-                height = max(xy.y for xy in self.coordinates) + 1
+                height = max(self.column_heights.values()) + 1
 
-    def get_related_nodes(self, node, parent=False, child=False):
-        uniq = {}
+    def index_edges(self):
+        # adjacency maps (node -> related nodes) of unfolded edges
+        self.parents = {}
+        self.children = {}
         for edge in self.edges:
             if edge.folded:
                 continue
 
-            if parent and edge.node2 == node:
-                uniq[edge.node1] = 1
-            elif child and edge.node1 == node:
-                uniq[edge.node2] = 1
+            self.parents.setdefault(edge.node2, {})[edge.node1] = 1
+            self.children.setdefault(edge.node1, {})[edge.node2] = 1
+
+    def get_related_nodes(self, node, parent=False, child=False):
+        uniq = {}
+        if parent:
+            uniq.update(self.parents.get(node, {}))
+        if child:
+            uniq.update(self.children.get(node, {}))
 
         related = []
         for uniq_node in uniq.keys():
@@ -212,35 +235,161 @@ class DiagramLayoutManager:
         return self.get_related_nodes(node, child=True)
 
     def detect_circulars(self):
-        for node in self.diagram.nodes:
-            if not [x for x in self.circulars if node in x]:
-                self.detect_circulars_sub(node, [node])
+        # Circular paths can only be found in strongly connected components.
+        # Search them in each component from the nodes where a depth first
+        # search over the diagram enters it, in the order of the search.
+        components = self.find_components()
+
+        circulars = {}
+        for node in self.find_entries(components):
+            component = components[node]
+            found = circulars.setdefault(component, ([], set()))
+            if found[0] is not None:
+                if not self.find_circular_paths(node, component, *found):
+                    circulars[component] = (None, None)  # too many paths
+
+        for component, (paths, _) in circulars.items():
+            if paths is None:
+                self.circulars.append(list(component))
+            else:
+                self.circulars.extend(self.merge_circulars(paths))
+
+    def find_components(self):
+        """Find strongly connected components with Tarjan's algorithm.
+           Returns a dict mapping nodes to their (circular) components.
+        """
+        index = {}
+        lowlink = {}
+        postorder = {}
+        stack = []
+        onstack = set()
+        components = {}
+
+        def visit(node):
+            index[node] = lowlink[node] = len(index)
+            stack.append(node)
+            onstack.add(node)
+            # visit latter children first; circular nodes follow their path
+            return (node, reversed(self.get_child_nodes(node)))
+
+        for root in self.diagram.nodes:
+            if root in index:
+                continue
+
+            path = [visit(root)]
+            while path:
+                node, children = path[-1]
+                for child in children:
+                    if child not in index:
+                        path.append(visit(child))
+                        break
+                    elif child in onstack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                else:
+                    path.pop()
+                    postorder[node] = len(postorder)
+                    if path:
+                        parent = path[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                    if lowlink[node] == index[node]:
+                        component = [stack.pop()]
+                        while component[-1] != node:
+                            component.append(stack.pop())
+                        onstack.difference_update(component)
+
+                        # sort circular nodes by reverse postorder
+                        if len(component) > 1:
+                            component.sort(key=lambda n: postorder[n],
+                                           reverse=True)
+                            for n in component:
+                                components[n] = tuple(component)
+
+        return components
+
+    def find_entries(self, components):
+        """Yield nodes where a depth first search enters components"""
+        entered = set()
+        visited = set()
+        for root in self.diagram.nodes:
+            if root in visited:
+                continue
+
+            visited.add(root)
+            if root in components:
+                entered.add(root)
+                yield root
+
+            path = [(root, iter(self.get_child_nodes(root)))]
+            while path:
+                node, children = path[-1]
+                for child in children:
+                    component = components.get(child)
+                    if component and component != components.get(node):
+                        if child not in entered:
+                            entered.add(child)
+                            yield child
+
+                    if child not in visited:
+                        visited.add(child)
+                        path.append((child, iter(self.get_child_nodes(child))))
+                        break
+                else:
+                    path.pop()
+
+    def find_circular_paths(self, node, component, paths, found):
+        """Find circular paths in the component from node.
+           Returns False if the search takes more than
+           ``max_circular_search`` steps in the component.
+        """
+        def children(node):
+            return iter([n for n in self.get_child_nodes(node)
+                         if n in component])
+
+        steps = 0
+        path = [node]
+        stack = [children(node)]
+        while stack:
+            for child in stack[-1]:
+                steps += 1
+                if steps > self.max_circular_search:
+                    return False
+
+                if child in path:
+                    circular = tuple(path[path.index(child):])
+                    if circular not in found:
+                        found.add(circular)
+                        paths.append(list(circular))
+                else:
+                    path.append(child)
+                    stack.append(children(child))
+                    break
+            else:
+                stack.pop()
+                path.pop()
+
+        return True
 
+    @staticmethod
+    def merge_circulars(circulars):
         # remove part of other circular
-        for c1 in self.circulars[:]:
-            for c2 in self.circulars:
+        for c1 in circulars[:]:
+            for c2 in circulars:
                 intersect = set(c1) & set(c2)
 
                 if c1 != c2 and set(c1) == intersect:
-                    if c1 in self.circulars:
-                        self.circulars.remove(c1)
+                    if c1 in circulars:
+                        circulars.remove(c1)
                     break
 
                 if c1 != c2 and intersect:
-                    if c1 in self.circulars:
-                        self.circulars.remove(c1)
-                    self.circulars.remove(c2)
-                    self.circulars.append(c1 + c2)
+                    if c1 in circulars:
+                        circulars.remove(c1)
+                    circulars.remove(c2)
+                    circulars.append(c1 + c2)
                     break
 
-    def detect_circulars_sub(self, node, parents):
-        for child in self.get_child_nodes(node):
-            if child in parents:
-                i = parents.index(child)
-                if parents[i:] not in self.circulars:
-                    self.circulars.append(parents[i:])
-            else:
-                self.detect_circulars_sub(child, parents + [child])
+        return circulars
 
     def is_circular_ref(self, node1, node2):
         for circular in self.circulars:
@@ -371,6 +520,7 @@ class DiagramLayoutManager:
             else:
                 return 1
 
+        DiagramEdge = self.context.DiagramEdge
         edges = (DiagramEdge.find(parent, node1) +
                  DiagramEdge.find(parent, node2))
         edges.sort(key=cmp_to_key(compare))
@@ -384,7 +534,11 @@ class DiagramLayoutManager:
     def mark_xy(self, xy, width, height):
         for w in range(width):
             for h in range(height):
-                self.coordinates.append(XY(xy.x + w, xy.y + h))
+                self.coordinates.add(XY(xy.x + w, xy.y + h))
+
+            bottom = xy.y + height - 1
+            lowest = self.column_heights.get(xy.x + w, bottom)
+            self.column_heights[xy.x + w] = max(lowest, bottom)
 
     def set_node_ypos(self, node, height=0):
         for x in range(node.colwidth):
@@ -426,7 +580,8 @@ class DiagramLayoutManager:
 
                 if (prev_child and grandchild > 1 and
                    (not self.is_rhombus(prev_child, child))):
-                    coord = [p.y for p in self.coordinates if p.x > child.xy.x]
+                    coord = [y for x, y in self.column_heights.items()
+                             if x > child.xy.x]
                     if coord and max(coord) >= node.xy.y:
                         height = max(coord) + 1
 
@@ -471,7 +626,7 @@ class DiagramLayoutManager:
 
     def get_parent_node_ypos(self, parent, child):
         heights = []
-        for e in DiagramEdge.find(parent, child):
+        for e in self.context.DiagramEdge.find(parent, child):
             y = parent.xy.y
 
             node = e.node1
@@ -523,103 +678,65 @@ class EdgeLayoutManager(object):
                 yield edge
 
     def run(self):
+        occupied = set(node.xy for node in self.nodes)
         for edge in self.edges:
-            _dir = edge.direction
-
-            if edge.node1.group.orientation == 'landscape':
-                if _dir == 'right':
-                    r = range(edge.node1.xy.x + 1, edge.node2.xy.x)
-                    for x in r:
-                        xy = (x, edge.node1.xy.y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-                elif _dir == 'right-up':
-                    r = range(edge.node1.xy.x + 1, edge.node2.xy.x)
-                    for x in r:
-                        xy = (x, edge.node1.xy.y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-                elif _dir == 'right-down':
-                    if self.diagram.edge_layout == 'flowchart':
-                        r = range(edge.node1.xy.y, edge.node2.xy.y)
-                        for y in r:
-                            xy = (edge.node1.xy.x, y + 1)
-                            nodes = [x for x in self.nodes if x.xy == xy]
-                            if len(nodes) > 0:
-                                edge.skipped = 1
-
-                    r = range(edge.node1.xy.x + 1, edge.node2.xy.x)
-                    for x in r:
-                        xy = (x, edge.node2.xy.y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-                elif _dir in ('left-down', 'down'):
-                    r = range(edge.node1.xy.y + 1, edge.node2.xy.y)
-                    for y in r:
-                        xy = (edge.node1.xy.x, y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-                elif _dir == 'up':
-                    r = range(edge.node2.xy.y + 1, edge.node1.xy.y)
-                    for y in r:
-                        xy = (edge.node1.xy.x, y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-            else:
-                if _dir == 'right':
-                    r = range(edge.node1.xy.x + 1, edge.node2.xy.x)
-                    for x in r:
-                        xy = (x, edge.node1.xy.y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-                elif _dir in ('left-down', 'down'):
-                    r = range(edge.node1.xy.y + 1, edge.node2.xy.y)
-                    for y in r:
-                        xy = (edge.node1.xy.x, y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
-                elif _dir == 'right-down':
-                    if self.diagram.edge_layout == 'flowchart':
-                        r = range(edge.node1.xy.x, edge.node2.xy.x)
-                        for x in r:
-                            xy = (x + 1, edge.node1.xy.y)
-                            nodes = [x for x in self.nodes if x.xy == xy]
-                            if len(nodes) > 0:
-                                edge.skipped = 1
-
-                    r = range(edge.node1.xy.y + 1, edge.node2.xy.y)
-                    for y in r:
-                        xy = (edge.node2.xy.x, y)
-                        nodes = [x for x in self.nodes if x.xy == xy]
-                        if len(nodes) > 0:
-                            edge.skipped = 1
+            for xy in self.passing_cells(edge):
+                if xy in occupied:
+                    edge.skipped = 1
+                    break
+
+    def passing_cells(self, edge):
+        _dir = edge.direction
+        node1 = edge.node1.xy
+        node2 = edge.node2.xy
+
+        if edge.node1.group.orientation == 'landscape':
+            if _dir in ('right', 'right-up'):
+                for x in range(node1.x + 1, node2.x):
+                    yield (x, node1.y)
+            elif _dir == 'right-down':
+                if self.diagram.edge_layout == 'flowchart':
+                    for y in range(node1.y, node2.y):
+                        yield (node1.x, y + 1)
+
+                for x in range(node1.x + 1, node2.x):
+                    yield (x, node2.y)
+            elif _dir in ('left-down', 'down'):
+                for y in range(node1.y + 1, node2.y):
+                    yield (node1.x, y)
+            elif _dir == 'up':
+                for y in range(node2.y + 1, node1.y):
+                    yield (node1.x, y)
+        else:
+            if _dir == 'right':
+                for x in range(node1.x + 1, node2.x):
+                    yield (x, node1.y)
+            elif _dir in ('left-down', 'down'):
+                for y in range(node1.y + 1, node2.y):
+                    yield (node1.x, y)
+            elif _dir == 'right-down':
+                if self.diagram.edge_layout == 'flowchart':
+                    for x in range(node1.x, node2.x):
+                        yield (x + 1, node1.y)
+
+                for y in range(node1.y + 1, node2.y):
+                    yield (node2.x, y)
 
 
 class ScreenNodeBuilder:
     @classmethod
     def build(cls, tree, config=None, layout=True):
-        DiagramNode.clear()
-        DiagramEdge.clear()
-        NodeGroup.clear()
-        Diagram.clear()
-
         return cls(tree, config, layout).run()
 
-    def __init__(self, tree, config, layout):
-        self.diagram = DiagramTreeBuilder().build(tree, config)
+    def __init__(self, tree, config, layout, context=None):
+        self.context = context or BuildContext()
+        self.diagram = DiagramTreeBuilder(self.context).build(tree, config)
         self.config = config
         self.layout = layout
 
     def run(self):
         if self.layout:
-            DiagramLayoutManager(self.diagram).run()
+            DiagramLayoutManager(self.diagram, self.context).run()
             self.diagram.fixiate(True)
 
         EdgeLayoutManager(self.diagram).run()
@@ -662,7 +779,7 @@ class SeparateDiagramBuilder(ScreenNodeBuilder):
                 n.colheight = 1
                 n.separated = False
 
-            for edge in DiagramEdge.find_all():
+            for edge in self.context.DiagramEdge.find_all():
                 edge.skipped = False
                 edge.crosspoints = []
 
@@ -696,14 +813,16 @@ class SeparateDiagramBuilder(ScreenNodeBuilder):
         return filtered.values()
 
     def run(self):
+        DiagramEdge = self.context.DiagramEdge
         for i, group in enumerate(self._groups):
             base = self.diagram.duplicate()
             base.level = group.level - 1
 
             # bind edges on base diagram (outer the group)
-            edges = (DiagramEdge.find(None, group) +
-                     DiagramEdge.find(group, None))
-            base.edges = self._filter_edges(edges, self.diagram, group.level)
+            incoming = DiagramEdge.find(None, group)
+            outgoing = DiagramEdge.find(group, None)
+            base.edges = self._filter_edges(incoming + outgoing,
+                                            self.diagram, group.level)
 
             # bind edges on target group (inner the group)
             subgroups = group.traverse_groups()
@@ -723,9 +842,9 @@ class SeparateDiagramBuilder(ScreenNodeBuilder):
                     g.separated = True
 
             # pick up nodes to base diagram
-            nodes1 = [e.node1 for e in DiagramEdge.find(None, group)]
+            nodes1 = [e.node1 for e in incoming]
             nodes1.sort(key=lambda x: x.order)
-            nodes2 = [e.node2 for e in DiagramEdge.find(group, None)]
+            nodes2 = [e.node2 for e in outgoing]
             nodes2.sort(key=lambda x: x.order)
 
             nodes = nodes1 + [group] + nodes2
@@ -738,7 +857,7 @@ class SeparateDiagramBuilder(ScreenNodeBuilder):
             if isinstance(group, Diagram):
                 base = group
 
-            DiagramLayoutManager(base).run()
+            DiagramLayoutManager(base, self.context).run()
             base.fixiate(True)
             EdgeLayoutManager(base).run()
 
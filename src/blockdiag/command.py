@@ -17,9 +17,6 @@ import re
 import sys
 
 import blockdiag
-import blockdiag.builder
-import blockdiag.drawer
-import blockdiag.parser
 from blockdiag.utils.bootstrap import Application, Options
 
 
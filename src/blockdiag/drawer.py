@@ -51,6 +51,7 @@ class DiagramDraw(object):
 
         self.drawer.set_canvas_size(self.pagesize())
         self.drawer.set_options(jump_radius=self.metrics.cellsize / 2)
+        self.shapes = {}
 
     def create_metrics(self, *args, **kwargs):
         return DiagramMetrics(*args, **kwargs)
@@ -83,7 +84,25 @@ class DiagramDraw(object):
         height = self.diagram.colheight
         return metrics.pagesize(width, height)
 
+    def shape(self, node):
+        """Return the shape of the node (created once for each metrics)"""
+        key = (node, self.metrics)
+        if key not in self.shapes:
+            renderer = noderenderer.get(node.shape)
+            self.shapes[key] = renderer(node, self.metrics)
+
+        return self.shapes[key]
+
+    def jump_lines(self):
+        """Lines drawn with jumps on their crosspoints (shafts of edges)"""
+        for edge in self.edges:
+            for line in self.metrics.edge(edge).shaft.polylines:
+                yield line
+
     def draw(self, **kwargs):
+        # find crosspoints of edges before drawing
+        self.drawer.set_options(jump_lines=self.jump_lines())
+
         # switch metrics object during draw backgrounds
         temp, self.metrics = self.metrics, self.metrics.original_metrics
         self._draw_background()
@@ -110,9 +129,7 @@ class DiagramDraw(object):
         # Drop node shadows.
         for node in self.nodes:
             if node.color != 'none' and self.diagram.shadow_style != 'none':
-                r = noderenderer.get(node.shape)
-
-                shape = r(node, self.metrics)
+                shape = self.shape(node)
                 if node.href and self.format == 'SVG':
                     drawer = self.drawer.anchor(node.href)
                 else:
@@ -142,8 +159,7 @@ class DiagramDraw(object):
             self.group_label(node, **kwargs)
 
     def node(self, node, **kwargs):
-        r = noderenderer.get(node.shape)
-        shape = r(node, self.metrics)
+        shape = self.shape(node)
         if node.href and self.format == 'SVG':
             drawer = self.drawer.anchor(node.href)
         else:
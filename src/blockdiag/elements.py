@@ -23,6 +23,7 @@ from blockdiag.utils.logging import warning
 
 
 class Base(object):
+    context = None
     basecolor = (255, 255, 255)
     textcolor = (0, 0, 0)
     fontfamily = None
@@ -66,8 +67,13 @@ class Base(object):
         value = unquote(attr.value)
 
         if name == 'class':
-            if value in Diagram.classes:
-                klass = Diagram.classes[value]
+            if self.context:
+                classes = self.context.classes
+            else:
+                classes = Diagram.classes
+
+            if value in classes:
+                klass = classes[value]
                 self.set_attributes(klass.attrs)
             else:
                 msg = "Unknown class: %s" % value
@@ -201,15 +207,24 @@ class DiagramNode(Element):
             msg = "unknown node shape: %s" % value
             raise AttributeError(msg)
 
+    def resolve_path(self, path):
+        basedir = self.context and self.context.basedir
+        if basedir and not urlutil.isurl(path):
+            return os.path.join(basedir, path)
+        else:
+            return path
+
     def set_icon(self, value):
-        if urlutil.isurl(value) or os.path.isfile(value):
-            self.icon = value
+        path = self.resolve_path(value)
+        if urlutil.isurl(path) or os.path.isfile(path):
+            self.icon = path
         else:
             warning("icon image not found: %s", value)
 
     def set_background(self, value):
-        if urlutil.isurl(value) or os.path.isfile(value):
-            self.background = value
+        path = self.resolve_path(value)
+        if urlutil.isurl(path) or os.path.isfile(path):
+            self.background = path
         else:
             warning("background image not found: %s", value)
 
@@ -352,6 +367,7 @@ class NodeGroup(Element):
 class DiagramEdge(Base):
     basecolor = (0, 0, 0)
     namespace = {}
+    reverse_namespace = {}
 
     @classmethod
     def get(cls, node1, node2):
@@ -362,6 +378,10 @@ class DiagramEdge(Base):
             obj = cls(node1, node2)
             cls.namespace[node1][node2] = obj
 
+            if node2 not in cls.reverse_namespace:
+                cls.reverse_namespace[node2] = {}
+            cls.reverse_namespace[node2][node1] = obj
+
         return cls.namespace[node1][node2]
 
     @classmethod
@@ -369,15 +389,26 @@ class DiagramEdge(Base):
         if node1 is None and node2 is None:
             return cls.find_all()
         elif isinstance(node1, NodeGroup):
-            edges = cls.find(None, node2)
+            if node2 is None:
+                edges = (e for n in cls.group_members(node1)
+                         for e in cls.find(n, None))
+            else:
+                edges = cls.find(None, node2)
             edges = (e for e in edges if e.node1.group.is_parent(node1))
             return [e for e in edges if not e.node2.group.is_parent(node1)]
         elif isinstance(node2, NodeGroup):
-            edges = cls.find(node1, None)
+            if node1 is None:
+                edges = (e for n in cls.group_members(node2)
+                         for e in cls.find(None, n))
+            else:
+                edges = cls.find(node1, None)
             edges = (e for e in edges if e.node2.group.is_parent(node2))
             return [e for e in edges if not e.node1.group.is_parent(node2)]
         elif node1 is None:
-            return [e for e in cls.find_all() if e.node2 == node2]
+            if node2 not in cls.reverse_namespace:
+                return []
+
+            return list(cls.reverse_namespace[node2].values())
         else:
             if node1 not in cls.namespace:
                 return []
@@ -390,6 +421,11 @@ class DiagramEdge(Base):
 
         return cls.namespace[node1][node2]
 
+    @staticmethod
+    def group_members(group):
+        return (n for n in group.traverse_nodes()
+                if not isinstance(n, NodeGroup))
+
     @classmethod
     def find_all(cls):
         for v1 in cls.namespace.values():
@@ -426,6 +462,7 @@ class DiagramEdge(Base):
     def clear(cls):
         super(DiagramEdge, cls).clear()
         cls.namespace = {}
+        cls.reverse_namespace = {}
         cls.basecolor = (0, 0, 0)
 
     def __init__(self, node1, node2):
@@ -579,7 +616,7 @@ class Diagram(NodeGroup):
 
     def set_default_shape(self, value):
         if noderenderer.get(value):
-            DiagramNode.set_default_shape(value)
+            self._DiagramNode.set_default_shape(value)
         else:
             msg = "unknown node shape: %s" % value
             raise AttributeError(msg)
@@ -587,7 +624,7 @@ class Diagram(NodeGroup):
     def set_default_label_orientation(self, value):
         value = value.lower()
         if value in ('horizontal', 'vertical'):
-            DiagramNode.label_orientation = value
+            self._DiagramNode.label_orientation = value
         else:
             msg = "unknown label orientation: %s" % value
             raise AttributeError(msg)
@@ -660,3 +697,55 @@ class Diagram(NodeGroup):
     def set_fontsize(self, value):
         warning("fontsize is obsoleted; use default_fontsize")
         self.set_default_fontsize(int(value))
+
+
+class BuildContext(object):
+    """Element registries and per-class defaults for a single build.
+
+    The context derives private subclasses of the element classes of
+    ``diagram_class``.  Their namespaces, classes and default attributes
+    (basecolor, textcolor, fontsize and so on) and the loaded plugins
+    belong to this context only, so several diagrams can be built at the
+    same time.
+    """
+    basedir = None  # directory to resolve relative paths of images
+
+    def __init__(self, diagram_class=Diagram):
+        self.loaded_plugins = []
+        self.node_handlers = []
+
+        self.Diagram = self._derive(diagram_class)
+        self.DiagramNode = self._derive(diagram_class._DiagramNode)
+        self.DiagramEdge = self._derive(diagram_class._DiagramEdge)
+        self.NodeGroup = self._derive(diagram_class._NodeGroup)
+
+        self.Diagram._DiagramNode = self.DiagramNode
+        self.Diagram._DiagramEdge = self.DiagramEdge
+        self.Diagram._NodeGroup = self.NodeGroup
+
+    @classmethod
+    def wrap(cls, diagram_class=Diagram):
+        """Make a context using the element classes of ``diagram_class``
+        as they are.  Their registries and plugins are shared by the whole
+        process.
+        """
+        context = cls.__new__(cls)
+        context.loaded_plugins = plugins.loaded_plugins
+        context.node_handlers = plugins.node_handlers
+        context.Diagram = diagram_class
+        context.DiagramNode = diagram_class._DiagramNode
+        context.DiagramEdge = diagram_class._DiagramEdge
+        context.NodeGroup = diagram_class._NodeGroup
+
+        return context
+
+    def _derive(self, klass):
+        attrs = dict(__module__=klass.__module__, context=self)
+        derived = type(klass.__name__, (klass,), attrs)
+        derived.clear()
+
+        return derived
+
+    @property
+    def classes(self):
+        return self.Diagram.classes
@@ -13,22 +13,41 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import pkg_resources
+import threading
 
+from blockdiag.utils import entrypoints
 from blockdiag.utils.logging import warning
 
 drawers = {}
+loaded = set()
+init_lock = threading.Lock()
+
+
+def load_imagedrawer(name, debug=False):
+    """Load the imagedrawer registered as entry point ``name``"""
+    if name in loaded:
+        return
+
+    drawer = entrypoints.get('blockdiag_imagedrawers').get(name)
+    if drawer is None:
+        return
+
+    with init_lock:
+        if name not in loaded:
+            try:
+                module = drawer.load()
+                if hasattr(module, 'setup'):
+                    module.setup(module)
+            except Exception as exc:
+                if debug:
+                    warning('Failed to load %s: %r' % (drawer.value, exc))
+
+            loaded.add(name)
 
 
 def init_imagedrawers(debug=False):
-    for drawer in pkg_resources.iter_entry_points('blockdiag_imagedrawers'):
-        try:
-            module = drawer.load()
-            if hasattr(module, 'setup'):
-                module.setup(module)
-        except Exception as exc:
-            if debug:
-                warning('Failed to load %s: %r' % (drawer.module_name, exc))
+    for name in entrypoints.get('blockdiag_imagedrawers'):
+        load_imagedrawer(name, debug)
 
 
 def install_imagedrawer(ext, drawer):
@@ -36,10 +55,13 @@ def install_imagedrawer(ext, drawer):
 
 
 def create(_format, filename, **kwargs):
-    if len(drawers) == 0:
-        init_imagedrawers(debug=kwargs.get('debug'))
-
     _format = _format.lower()
+    if _format not in drawers:
+        # builtin drawers are registered as "imagedraw_<format>"
+        load_imagedrawer('imagedraw_%s' % _format, kwargs.get('debug'))
+        if _format not in drawers:
+            init_imagedrawers(debug=kwargs.get('debug'))
+
     if _format in drawers:
         drawer = drawers[_format](filename, **kwargs)
     else:
@@ -21,7 +21,8 @@ from blockdiag.utils import Box
 
 class ImageDraw(object):
     self_generative_methods = []
-    nosideeffect_methods = ['set_canvas_size', 'textsize', 'textlinesize']
+    nosideeffect_methods = ['set_canvas_size', 'textsize', 'textlinesize',
+                            'textlinesizes']
     supported_path = False
     baseline_text_rendering = False
 
@@ -62,6 +63,9 @@ class ImageDraw(object):
     def textlinesize(self, string, font, **kwargs):
         pass
 
+    def textlinesizes(self, strings, font):
+        return [self.textlinesize(string, font) for string in strings]
+
     def text(self, xy, string, font, **kwargs):
         pass
 
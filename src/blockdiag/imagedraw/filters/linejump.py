@@ -14,10 +14,64 @@
 #  limitations under the License.
 
 import functools
+from bisect import bisect_left, bisect_right, insort
 
 from blockdiag.utils import XY, Box
 
 
+class XTree(object):
+    """Sorted multiset of x coordinates.
+
+    Coordinates are kept in sorted buckets of bounded size (like
+    ``sortedcontainers.SortedList``), so updates take O(log n) bisects
+    plus a short memmove, and range queries take O(log n + k).
+    """
+    BUCKET_SIZE = 512
+
+    def __init__(self):
+        self.buckets = []
+        self.maxes = []
+
+    def add(self, x):
+        if not self.buckets:
+            self.buckets.append([x])
+            self.maxes.append(x)
+            return
+
+        i = min(bisect_left(self.maxes, x), len(self.buckets) - 1)
+        bucket = self.buckets[i]
+        insort(bucket, x)
+        self.maxes[i] = bucket[-1]
+
+        if len(bucket) > self.BUCKET_SIZE * 2:  # split the bucket
+            half = bucket[self.BUCKET_SIZE:]
+            del bucket[self.BUCKET_SIZE:]
+            self.buckets.insert(i + 1, half)
+            self.maxes.insert(i, bucket[-1])
+
+    def remove(self, x):
+        i = bisect_left(self.maxes, x)
+        bucket = self.buckets[i]
+        del bucket[bisect_left(bucket, x)]
+
+        if bucket:
+            self.maxes[i] = bucket[-1]
+        else:
+            del self.buckets[i]
+            del self.maxes[i]
+
+    def between(self, x1, x2):
+        """Generate coordinates in the set (exclusive of x1 and x2)"""
+        for i in range(bisect_right(self.maxes, x1), len(self.buckets)):
+            bucket = self.buckets[i]
+            end = bisect_left(bucket, x2)
+            for x in bucket[bisect_right(bucket, x1):end]:
+                yield x
+
+            if end < len(bucket):
+                break
+
+
 class LazyReceiver(object):
     def __init__(self, target):
         self.target = target
@@ -75,6 +129,14 @@ class LazySubReceiver(LazyReceiver):
 
 
 class LineJumpDrawFilter(LazyReceiver):
+    """Draw jumps on crosspoints of lines having ``jump=True``.
+
+    If the lines are given up front through ``set_options(jump_lines=...)``,
+    drawing calls go straight through to the target drawer.  Otherwise,
+    all calls are recorded and replayed on ``save()``; so are the calls
+    following a jumping line which is not given up front.
+    """
+
     def __init__(self, target, jump_radius):
         super(LineJumpDrawFilter, self).__init__(target)
         self.ytree = []
@@ -83,6 +145,14 @@ class LineJumpDrawFilter(LazyReceiver):
         self.forward = 'holizonal'
         self.jump_radius = jump_radius
         self.jump_shift = 0
+        self.jump_lines = set()
+        self.deferred = True
+
+    def __getattr__(self, name):
+        if self.deferred:
+            return self.get_lazy_method(name)
+        else:
+            return getattr(self.target, name)
 
     def set_options(self, **kwargs):
         if 'jump_forward' in kwargs:
@@ -94,26 +164,43 @@ class LineJumpDrawFilter(LazyReceiver):
         if 'jump_shift' in kwargs:
             self.jump_shift = kwargs['jump_shift']
 
+        if 'jump_lines' in kwargs:
+            for line in kwargs['jump_lines']:
+                for st, ed in zip(line[:-1], line[1:]):
+                    self._add_jumpline(st, ed)
+                    self.jump_lines.add((st, ed))
+
+            self._find_crosspoints()
+            self._run()  # draw deferred calls
+            self.calls = []
+            self.deferred = False
+
     def _run(self):
         for name, args, kwargs in self.calls:
-            if name == 'line' and kwargs.get('jump'):
-                ((x1, y1), (x2, y2)) = args[0]
-                if self.forward == 'holizonal' and y1 == y2:
-                    self._holizonal_jumpline(x1, y1, x2, y2, **kwargs)
-                    continue
-                elif self.forward == 'vertical' and x1 == x2:
-                    self._vertical_jumpline(x1, y1, x2, y2, **kwargs)
-                    continue
-
-            method = self._find_method(name)
-            method(self.target, *args, **kwargs)
+            if name == 'line':
+                self._line(*args, **kwargs)
+            else:
+                method = self._find_method(name)
+                method(self.target, *args, **kwargs)
+
+    def _line(self, xy, **kwargs):
+        if kwargs.get('jump'):
+            ((x1, y1), (x2, y2)) = xy
+            if self.forward == 'holizonal' and y1 == y2:
+                self._holizonal_jumpline(x1, y1, x2, y2, **kwargs)
+                return
+            elif self.forward == 'vertical' and x1 == x2:
+                self._vertical_jumpline(x1, y1, x2, y2, **kwargs)
+                return
+
+        self.target.line(xy, **kwargs)
 
     def _holizonal_jumpline(self, x1, y1, x2, y2, **kwargs):
         y = y1
         if x2 < x1:
             x1, x2 = x2, x1
 
-        for x in sorted(self.x_cross.get(y, [])):
+        for x in self.x_cross.get(y, []):
             if x1 < x and x < x2:
                 arckwargs = dict(kwargs)
                 del arckwargs['jump']
@@ -133,7 +220,7 @@ class LineJumpDrawFilter(LazyReceiver):
         if y2 < y1:
             y1, y2 = y2, y1
 
-        for y in sorted(self.y_cross.get(x, [])):
+        for y in self.y_cross.get(x, []):
             if y1 < y and y < y2:
                 arckwargs = dict(kwargs)
                 del arckwargs['jump']
@@ -149,35 +236,55 @@ class LineJumpDrawFilter(LazyReceiver):
         self.target.line((XY(x, y1), XY(x, y2)), **kwargs)
 
     def line(self, xy, **kwargs):
-        from bisect import insort
         for st, ed in zip(xy[:-1], xy[1:]):
-            self.get_lazy_method("line")((st, ed), **kwargs)
-
-            if 'jump' in kwargs and kwargs['jump'] is True:
-                if st.y == ed.y:    # horizonal
-                    insort(self.ytree, (st.y, 0, (st, ed)))
-                elif st.x == ed.x:  # vertical
-                    insort(self.ytree, (max(st.y, ed.y), -1, (st, ed)))
-                    insort(self.ytree, (min(st.y, ed.y), +1, (st, ed)))
+            if kwargs.get('jump') is True and (st, ed) not in self.jump_lines:
+                # crosspoints of the line are not known yet; record calls
+                # from here and find crosspoints again on save()
+                self._add_jumpline(st, ed)
+                self.jump_lines.add((st, ed))
+                self.deferred = True
+
+            if self.deferred:
+                self.get_lazy_method("line")((st, ed), **kwargs)
+            else:
+                self._line((st, ed), **kwargs)
+
+    def _add_jumpline(self, st, ed):
+        if st.y == ed.y:    # horizonal
+            self.ytree.append((st.y, 0, (st, ed)))
+        elif st.x == ed.x:  # vertical
+            self.ytree.append((max(st.y, ed.y), -1, (st, ed)))
+            self.ytree.append((min(st.y, ed.y), +1, (st, ed)))
+
+    def _find_crosspoints(self):
+        """Sweep lines from top to bottom to find crosspoints of
+           horizonal lines and vertical lines.
+           Vertical lines crossing the sweep line are kept in XTree.
+        """
+        self.ytree.sort(key=lambda event: event[:2])
+        xtree = XTree()
+
+        x_cross = {}
+        y_cross = {}
+        for y, kind, ((x1, _), (x2, _)) in self.ytree:
+            if kind == +1:  # top of vertical line
+                xtree.add(x1)
+            elif kind == -1:  # bottom of vertical line
+                xtree.remove(x1)
+            else:
+                if x2 < x1:
+                    x1, x2 = x2, x1
+
+                for x in xtree.between(x1, x2):
+                    x_cross.setdefault(y, set()).add(x)
+                    y_cross.setdefault(x, set()).add(y)
+
+        self.x_cross = dict((y, sorted(xs)) for y, xs in x_cross.items())
+        self.y_cross = dict((x, sorted(ys)) for x, ys in y_cross.items())
 
     def save(self, *args, **kwargs):
-        # Search crosspoints
-        from bisect import bisect_left, bisect_right, insort
-        xtree = []
-        for y, _, ((x1, y1), (x2, y2)) in self.ytree:
-            if x2 < x1:
-                x1, x2 = x2, x1
-            if y2 < y1:
-                y1, y2 = y2, y1
-
-            if y == y1:
-                insort(xtree, x1)
-
-            if y == y2:
-                del xtree[bisect_left(xtree, x1)]
-                for x in xtree[bisect_right(xtree, x1):bisect_left(xtree, x2)]:
-                    self.x_cross.setdefault(y, set()).add(x)
-                    self.y_cross.setdefault(x, set()).add(y)
+        if self.deferred:
+            self._find_crosspoints()
+            self._run()
 
-        self._run()
         return self.target.save(*args, **kwargs)
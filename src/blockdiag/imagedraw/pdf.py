@@ -20,9 +20,10 @@ from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
+from reportlab.pdfgen.canvas import aspectRatioFix
 
 from blockdiag.imagedraw import base
-from blockdiag.imagedraw.utils import memoize
+from blockdiag.imagedraw.utils import memoize_textsize
 from blockdiag.utils import Box, Size, images
 from blockdiag.utils.fontmap import parse_fontpath
 
@@ -40,6 +41,25 @@ class PDFImageDraw(base.ImageDraw):
     def set_canvas_size(self, size):
         self.canvas = canvas.Canvas(self.filename, pagesize=size)
         self.size = size
+        self.state = {}
+        self.saved_states = []
+        self.images = {}
+
+    def update_state(self, name, value):
+        """Record the graphics state; returns False if it is not changed"""
+        if name in self.state and self.state[name] == value:
+            return False
+
+        self.state[name] = value
+        return True
+
+    def save_state(self):
+        self.canvas.saveState()
+        self.saved_states.append(dict(self.state))
+
+    def restore_state(self):
+        self.canvas.restoreState()
+        self.state = self.saved_states.pop()
 
     def set_font(self, font):
         if font.path is None:
@@ -56,7 +76,8 @@ class PDFImageDraw(base.ImageDraw):
 
             self.fonts[font.path] = ttfont
 
-        self.canvas.setFont(font.path, font.size)
+        if self.update_state('font', (font.path, font.size)):
+            self.canvas.setFont(font.path, font.size)
 
     def set_render_params(self, **kwargs):
         self.set_stroke_color(kwargs.get('outline'))
@@ -81,36 +102,53 @@ class PDFImageDraw(base.ImageDraw):
             thick = 1
 
         if style == 'dotted':
-            self.canvas.setDash([2 * thick, 2 * thick])
+            dash = [2 * thick, 2 * thick]
         elif style == 'dashed':
-            self.canvas.setDash([4 * thick, 4 * thick])
+            dash = [4 * thick, 4 * thick]
         elif style == 'none':
-            self.canvas.setDash([0, 65535 * thick])
+            dash = [0, 65535 * thick]
         elif re.search(r'^\d+(,\d+)*$', style or ""):
-            self.canvas.setDash([int(n) * thick for n in style.split(',')])
+            dash = [int(n) * thick for n in style.split(',')]
         else:
-            self.canvas.setDash()
+            dash = None
+
+        if self.update_state('dash', dash):
+            if dash:
+                self.canvas.setDash(dash)
+            else:
+                self.canvas.setDash()
+
+    def set_line_width(self, thick):
+        if thick is None:
+            thick = 1
+
+        if self.update_state('width', thick):
+            self.canvas.setLineWidth(thick)
 
     def set_stroke_color(self, color="black"):
         if isinstance(color, str):
-            self.canvas.setStrokeColor(color)
+            if self.update_state('stroke', color):
+                self.canvas.setStrokeColor(color)
         elif color:
             rgb = (color[0] / 256.0, color[1] / 256.0, color[2] / 256.0)
-            self.canvas.setStrokeColorRGB(*rgb)
+            if self.update_state('stroke', rgb):
+                self.canvas.setStrokeColorRGB(*rgb)
         else:
             self.set_stroke_color()
 
     def set_fill_color(self, color="white"):
         if isinstance(color, str):
-            if color != 'none':
+            if color != 'none' and self.update_state('fill', color):
                 self.canvas.setFillColor(color)
         elif color:
             rgb = (color[0] / 256.0, color[1] / 256.0, color[2] / 256.0)
-            self.canvas.setFillColorRGB(*rgb)
+            if self.update_state('fill', rgb):
+                self.canvas.setFillColorRGB(*rgb)
         else:
             self.set_fill_color()
 
     def path(self, pd, **kwargs):
+        self.set_line_width(None)
         params = self.set_render_params(**kwargs)
         self.canvas.drawPath(pd, **params)
 
@@ -120,16 +158,11 @@ class PDFImageDraw(base.ImageDraw):
         width = box[2] - box[0]
         height = box[3] - box[1]
 
-        if 'thick' in kwargs and kwargs['thick'] is not None:
-            self.canvas.setLineWidth(kwargs['thick'])
-
+        self.set_line_width(kwargs.get('thick'))
         params = self.set_render_params(**kwargs)
         self.canvas.rect(x, y, width, height, **params)
 
-        if 'thick' in kwargs:
-            self.canvas.setLineWidth(1)
-
-    @memoize
+    @memoize_textsize
     def textlinesize(self, string, font):
         self.set_font(font)
         width = self.canvas.stringWidth(string, font.path, font.size)
@@ -141,7 +174,7 @@ class PDFImageDraw(base.ImageDraw):
         self.canvas.drawString(xy[0], self.size[1] - xy[1], string)
 
     def textarea(self, box, string, font, **kwargs):
-        self.canvas.saveState()
+        self.save_state()
 
         if 'rotate' in kwargs and kwargs['rotate'] != 0:
             angle = 360 - int(kwargs['rotate']) % 360
@@ -168,7 +201,7 @@ class PDFImageDraw(base.ImageDraw):
         for string, xy in lines.lines:
             self.text(xy, string, font, **kwargs)
             rendered = True
-        self.canvas.restoreState()
+        self.restore_state()
 
         if not rendered and font.size > 0:
             font.size = int(font.size * 0.8)
@@ -177,28 +210,27 @@ class PDFImageDraw(base.ImageDraw):
     def line(self, xy, **kwargs):
         self.set_stroke_color(kwargs.get('fill', 'none'))
         self.set_style(kwargs.get('style'), kwargs.get('thick'))
+        self.set_line_width(kwargs.get('thick'))
 
-        if 'thick' in kwargs and kwargs['thick'] is not None:
-            self.canvas.setLineWidth(kwargs['thick'])
-
-        p1 = xy[0]
+        pd = self.canvas.beginPath()
         y = self.size[1]
-        for p2 in xy[1:]:
-            self.canvas.line(p1.x, y - p1.y, p2.x, y - p2.y)
-            p1 = p2
+        pd.moveTo(xy[0][0], y - xy[0][1])
+        for p in xy[1:]:
+            pd.lineTo(p[0], y - p[1])
 
-        if 'thick' in kwargs:
-            self.canvas.setLineWidth(1)
+        self.canvas.drawPath(pd, stroke=1, fill=0)
 
     def arc(self, xy, start, end, **kwargs):
         start, end = 360 - end, 360 - start
         r = (360 + end - start) % 360
 
+        self.set_line_width(None)
         self.set_render_params(**kwargs)
         y = self.size[1]
         self.canvas.arc(xy[0], y - xy[3], xy[2], y - xy[1], start, r)
 
     def ellipse(self, xy, **kwargs):
+        self.set_line_width(None)
         params = self.set_render_params(**kwargs)
         y = self.size[1]
         self.canvas.ellipse(xy[0], y - xy[3], xy[2], y - xy[1], **params)
@@ -210,22 +242,47 @@ class PDFImageDraw(base.ImageDraw):
         for p in xy[1:]:
             pd.lineTo(p[0], y - p[1])
 
+        self.set_line_width(None)
         params = self.set_render_params(**kwargs)
         self.canvas.drawPath(pd, **params)
 
+    def load_image(self, url):
+        """Decode the image once and register it as a form XObject.
+           Returns the name and the size of the form (or None).
+        """
+        if url not in self.images:
+            try:
+                image = images.open(url, mode='pillow')
+                if image.mode not in ('RGBA', 'L', 'RGB', 'CYMYK'):
+                    # convert to format that reportlab can recognize
+                    image = image.convert('RGBA')
+
+                data = ImageReader(image)
+                name = 'image%d' % len(self.images)
+                self.canvas.beginForm(name, 0, 0, 1, 1)
+                self.canvas.drawImage(data, 0, 0, 1, 1, mask='auto')
+                self.canvas.endForm()
+
+                self.images[url] = (name, Size(*data.getSize()))
+            except IOError:
+                self.images[url] = None
+
+        return self.images[url]
+
     def image(self, box, url):
-        try:
-            image = images.open(url, mode='pillow')
-            if image.mode not in ('RGBA', 'L', 'RGB', 'CYMYK'):
-                # convert to format that reportlab can recognize
-                image = image.convert('RGBA')
-
-            y = self.size[1] - box[3]
-            data = ImageReader(image)
-            self.canvas.drawImage(data, box.x1, y, box.width, box.height,
-                                  mask='auto', preserveAspectRatio=True)
-        except IOError:
-            pass
+        form = self.load_image(url)
+        if form is not None:
+            name, size = form
+            x, y, width, height, _ = aspectRatioFix(True, 'c', box.x1,
+                                                    self.size[1] - box[3],
+                                                    box.width, box.height,
+                                                    size.width, size.height)
+
+            self.save_state()
+            self.canvas.translate(x, y)
+            self.canvas.scale(width, height)
+            self.canvas.doForm(name)
+            self.restore_state()
 
     def save(self, filename, size, _format):
         # Ignore size and format parameter; compatibility for ImageDrawEx.
@@ -15,19 +15,31 @@
 
 from __future__ import division
 
+import itertools
 import math
 import re
-from functools import partial, wraps
-from itertools import tee
+import threading
+from functools import lru_cache, partial, wraps
 
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
 
 from blockdiag.imagedraw import base
-from blockdiag.imagedraw.utils import memoize
+from blockdiag.imagedraw.utils import (memoize_textsize, textmetrics,
+                                       textmetrics_key)
 from blockdiag.imagedraw.utils.ellipse import dots as ellipse_dots
 from blockdiag.utils import XY, Box, Size, images
 from blockdiag.utils.fontmap import FontMap, parse_fontpath
-from blockdiag.utils.myitertools import istep, stepslice
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# padding around blurred shapes
+SHADOW_PADDING = 16
+
+# GaussianBlur radius equivalent to applying SMOOTH_MORE filter 15 times
+SHADOW_BLUR_RADIUS = 3.3
 
 
 def point_pairs(xylist):
@@ -40,45 +52,82 @@ def point_pairs(xylist):
 
 
 def line_segments(xylist):
-    p1, p2 = tee(point_pairs(xylist))
+    p1, p2 = itertools.tee(point_pairs(xylist))
     next(p2)
     return zip(p1, p2)
 
 
+def dash_offsets(length, cycle):
+    """Generate (start, end) offsets of dashes drawn on a line of
+       ``length`` pixels with dash pattern ``cycle`` (lengths of dash and
+       space in turn).  A dash not fitting to the end is dropped.
+    """
+    if sum(cycle) == 0:
+        return
+
+    steps = itertools.cycle(cycle)
+    pos = 0
+    while pos < length:
+        n = next(steps)
+        if n > 0:
+            if pos + n - 1 >= length:
+                break
+
+            yield (pos, pos + n - 1)
+
+        pos += n + next(steps)
+
+
+def dda_locus(pt1, pt2):
+    """Calculate the pixels on the diagonal line from pt1 to pt2
+       using DDA (Digital Differential Analyzer) Algorithm.
+    """
+    m = float(pt2[1] - pt1[1]) / float(pt2[0] - pt1[0])
+    if numpy:
+        # cumsum() adds values one by one as the loop below does
+        count = int(math.floor(pt2[0] - pt1[0])) + 1
+        xlist = numpy.cumsum([pt1[0]] + [1] * (count - 1), dtype=float)
+        ylist = numpy.cumsum([pt1[1]] + [m] * (count - 1), dtype=float)
+        xlist = xlist[xlist <= pt2[0]]
+        ylist = numpy.round(ylist[:len(xlist)])
+        return list(zip(xlist.astype(int).tolist(),
+                        ylist.astype(int).tolist()))
+    else:
+        locus = []
+        x = pt1[0]
+        y = pt1[1]
+        while x <= pt2[0]:
+            locus.append((int(x), int(round(y))))
+            x += 1
+            y += m
+
+        return locus
+
+
 def dashize_line(line, length):
     pt1, pt2 = line
     if pt1[0] == pt2[0]:  # holizonal
         if pt1[1] > pt2[1]:
             pt2, pt1 = line
 
-        r = stepslice(range(round(pt1[1]), round(pt2[1])), length)
-        for y1, y2 in istep(n for n in r):
-            yield [(pt1[0], y1), (pt1[0], y2)]
+        y = round(pt1[1])
+        for y1, y2 in dash_offsets(round(pt2[1]) - y, length):
+            yield [(pt1[0], y + y1), (pt1[0], y + y2)]
 
     elif pt1[1] == pt2[1]:  # vertical
         if pt1[0] > pt2[0]:
             pt2, pt1 = line
 
-        r = stepslice(range(round(pt1[0]), round(pt2[0])), length)
-        for x1, x2 in istep(n for n in r):
-            yield [(x1, pt1[1]), (x2, pt1[1])]
+        x = round(pt1[0])
+        for x1, x2 in dash_offsets(round(pt2[0]) - x, length):
+            yield [(x + x1, pt1[1]), (x + x2, pt1[1])]
     else:  # diagonal
         if pt1[0] > pt2[0]:
             pt2, pt1 = line
 
-        # DDA (Digital Differential Analyzer) Algorithm
-        locus = []
-        m = float(pt2[1] - pt1[1]) / float(pt2[0] - pt1[0])
-        x = pt1[0]
-        y = pt1[1]
-
-        while x <= pt2[0]:
-            locus.append((int(x), int(round(y))))
-            x += 1
-            y += m
-
-        for p1, p2 in istep(stepslice(locus, length)):
-            yield (p1, p2)
+        locus = dda_locus(pt1, pt2)
+        for i, j in dash_offsets(len(locus), length):
+            yield (locus[i], locus[j])
 
 
 def style2cycle(style, thick):
@@ -99,24 +148,80 @@ def style2cycle(style, thick):
     return length
 
 
+@lru_cache(maxsize=128)
+def load_truetype(path, index, size):
+    if index:
+        return ImageFont.truetype(path, size, index=index)
+    else:
+        return ImageFont.truetype(path, size)
+
+
 def ttfont_for(font):
     if font.path:
         path, index = parse_fontpath(font.path)
-        if index:
-            ttfont = ImageFont.truetype(path, font.size, index=index)
-        else:
-            ttfont = ImageFont.truetype(path, font.size)
+        ttfont = load_truetype(path, index, font.size)
     else:
         ttfont = None
 
     return ttfont
 
 
+class TextMeasurer(object):
+    """Measure size of text lines with Pillow.
+
+    A measurer is shared by PNG and SVG drawers of this process (see
+    ``measurer``); measured sizes are cached in ``textmetrics``.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.default_font = None
+
+    def measure(self, string, font):
+        ttfont = ttfont_for(font)
+        if ttfont is None:
+            if self.default_font is None:
+                self.default_font = ImageFont.load_default()
+
+            size = self.default_font.getsize(string)
+
+            font_ratio = font.size * 1.0 / FontMap.BASE_FONTSIZE
+            size = Size(int(size[0] * font_ratio),
+                        int(size[1] * font_ratio))
+        else:
+            size = Size(*ttfont.getsize(string))
+
+        return size
+
+    @memoize_textsize
+    def textlinesize(self, string, font):
+        with self.lock:
+            return self.measure(string, font)
+
+    def textlinesizes(self, strings, font):
+        """Measure text lines at once"""
+        keys = [textmetrics_key(__name__, string, font) for string in strings]
+        sizes = [textmetrics.get(key) for key in keys]
+        if None in sizes:
+            with self.lock:
+                for i, string in enumerate(strings):
+                    if sizes[i] is None:
+                        sizes[i] = self.measure(string, font)
+                        textmetrics.set(keys[i], sizes[i])
+
+        return sizes
+
+
+measurer = TextMeasurer()
+
+
 class ImageDrawExBase(base.ImageDraw):
     def __init__(self, filename, **kwargs):
         self.filename = filename
         self.transparency = kwargs.get('transparency')
         self.bgcolor = kwargs.get('color', (256, 256, 256))
+        self.shadow_filter = kwargs.get('shadow_filter') or 'smooth'
+        self.shadow_masks = {}
         self._image = None
         self.draw = None
 
@@ -129,7 +234,6 @@ class ImageDrawExBase(base.ImageDraw):
 
     def paste(self, image, pt, mask=None):
         self._image.paste(image, pt, mask)
-        self.draw = ImageDraw.Draw(self._image)
 
     def set_canvas_size(self, size):
         if self.transparency:
@@ -162,8 +266,8 @@ class ImageDrawExBase(base.ImageDraw):
                 end += 360
 
             cycle = style2cycle(style, kwargs.get('width'))
-            for pt in ellipse_dots(box, cycle, start, end):
-                self.draw.line([pt, pt], fill=kwargs['fill'])
+            dots = list(ellipse_dots(box, cycle, start, end))
+            self.draw.point(dots, fill=kwargs['fill'])
         else:
             self.draw.arc(box.to_integer_point(), start, end, **kwargs)
 
@@ -187,8 +291,8 @@ class ImageDrawExBase(base.ImageDraw):
                 del kwargs['outline']
 
             cycle = style2cycle(style, kwargs.get('width'))
-            for pt in ellipse_dots(box, cycle):
-                self.draw.line([pt, pt], fill=kwargs['fill'])
+            dots = list(ellipse_dots(box, cycle))
+            self.draw.point(dots, fill=kwargs['fill'])
         else:
             if kwargs.get('fill') == 'none':
                 del kwargs['fill']
@@ -222,7 +326,7 @@ class ImageDrawExBase(base.ImageDraw):
         cycle = style2cycle(style, kwargs.get('width'))
         for line in line_segments(xy):
             for subline in dashize_line(line, cycle):
-                self.line(subline, **kwargs)
+                self.draw.line(subline, **kwargs)
 
     def rectangle(self, box, **kwargs):
         thick = kwargs.get('thick', self.scale_ratio)
@@ -269,19 +373,11 @@ class ImageDrawExBase(base.ImageDraw):
         textfolder = super(ImageDrawExBase, self).textfolder
         return partial(textfolder, scale=self.scale_ratio)
 
-    @memoize
     def textlinesize(self, string, font):
-        ttfont = ttfont_for(font)
-        if ttfont is None:
-            size = self.draw.textsize(string, font=None)
+        return measurer.textlinesize(string, font)
 
-            font_ratio = font.size * 1.0 / FontMap.BASE_FONTSIZE
-            size = Size(int(size[0] * font_ratio),
-                        int(size[1] * font_ratio))
-        else:
-            size = Size(*ttfont.getsize(string))
-
-        return size
+    def textlinesizes(self, strings, font):
+        return measurer.textlinesizes(strings, font)
 
     def text(self, xy, string, font, **kwargs):
         fill = kwargs.get('fill')
@@ -302,16 +398,9 @@ class ImageDrawExBase(base.ImageDraw):
                 text_image = image.resize(basesize, Image.ANTIALIAS)
                 self.paste(text_image, xy, text_image)
         else:
-            size = ttfont.getsize(string)
-
-            # Generate mask to support BDF(bitmap font)
-            mask = Image.new('1', size)
-            draw = ImageDraw.Draw(mask)
-            draw.text((0, 0), string, fill='white', font=ttfont)
-
-            # Rendering text
-            filler = Image.new('RGB', size, fill)
-            self.paste(filler, xy, mask)
+            # Render glyphs without anti-aliasing to support BDF(bitmap font)
+            self.draw.fontmode = '1'
+            self.draw.text(xy, string, fill=fill, font=ttfont)
 
     def textarea(self, box, string, font, **kwargs):
         if 'rotate' in kwargs and kwargs['rotate'] != 0:
@@ -328,19 +417,17 @@ class ImageDrawExBase(base.ImageDraw):
             textbox = Box(0, 0, _box.width, _box.height)
             text.textarea(textbox, string, font, **kwargs)
 
-            filler = Image.new('RGB', box.size, kwargs.get('fill'))
-
             mask = text._image.rotate(angle, expand=True)
-            if mask.size != filler.size:
+            if mask.size != box.size:
                 # Image.rotate(expand=True) of Pillow earlier than
                 # 3.3.0 (including 2.x) returns image object with
                 # unexpected size: for example, rotating 10x20 by 270
                 # causes not 20x10 but 21x11.
                 # Therefore, crop rotated image in order to make it
-                # match against size of "filler".
+                # match against size of the box.
                 mask = mask.crop((0, 0, box.width, box.height))
 
-            self.paste(filler, box.topleft, mask)
+            self.paste(kwargs.get('fill'), box, mask)
             return
 
         lines = self.textfolder(box, string, font, **kwargs)
@@ -418,9 +505,20 @@ class ImageDrawExBase(base.ImageDraw):
         return image
 
 
+def shift_shape(shape, dx, dy):
+    if isinstance(shape, Box):
+        return shape.shift(dx, dy)
+    else:  # polygon
+        return [pt.shift(dx, dy) for pt in shape]
+
+
 def blurred(fn):
-    PADDING = 16
+    """Draw shapes blurred if filter option is given.
 
+    Each shape is blurred by applying SMOOTH_MORE filter 15 times (by
+    default), or GaussianBlur with ``shadow_filter='gaussian'``.  Blurred
+    images are cached per drawer, so identical shapes reuse them.
+    """
     def get_shape_box(*args):
         if fn.__name__ == 'polygon':
             xlist = [pt.x for pt in args[0]]
@@ -429,24 +527,30 @@ def blurred(fn):
         else:
             return args[0]
 
-    def get_abs_coordinate(box, *args):
-        dx = box.x1 - PADDING
-        dy = box.y1 - PADDING
-        if fn.__name__ == 'polygon':
-            return [pt.shift(-dx, -dy) for pt in args[0]]
-        else:
-            return box.shift(-dx, -dy)
-
     def create_shadow(self, size, *args, **kwargs):
         drawer = ImageDrawExBase(self.filename, transparency=True)
         drawer.set_canvas_size(size)
         getattr(drawer, fn.__name__)(*args, **kwargs)
 
-        for _ in range(15):
-            drawer._image = drawer._image.filter(ImageFilter.SMOOTH_MORE)
+        if self.shadow_filter == 'gaussian':
+            blur = ImageFilter.GaussianBlur(SHADOW_BLUR_RADIUS)
+            drawer._image = drawer._image.filter(blur)
+        else:
+            for _ in range(15):
+                drawer._image = drawer._image.filter(ImageFilter.SMOOTH_MORE)
 
         return drawer._image
 
+    def get_shadow(self, size, *args, **kwargs):
+        # identical shapes (shifted to the origin) share blurred images
+        key = (fn.__name__, size, tuple(args[0]), args[1:],
+               tuple(sorted(kwargs.items())))
+        if key not in self.shadow_masks:
+            self.shadow_masks[key] = create_shadow(self, size, *args,
+                                                   **kwargs)
+
+        return self.shadow_masks[key]
+
     @wraps(fn)
     def func(self, *args, **kwargs):
         args = list(args)
@@ -455,12 +559,14 @@ def blurred(fn):
             return fn(self, *args, **kwargs)
         else:
             box = get_shape_box(*args)
-            args[0] = get_abs_coordinate(box, *args)
-
-            size = Size(box.width + PADDING * 2, box.height + PADDING * 2)
-            shadow = create_shadow(self, size, *args, **kwargs)
-            xy = XY(box.x1 - PADDING, box.y1 - PADDING)
-            self.paste(shadow, xy, shadow)
+            dx = box.x1 - SHADOW_PADDING
+            dy = box.y1 - SHADOW_PADDING
+            args[0] = shift_shape(args[0], -dx, -dy)
+
+            size = Size(box.width + SHADOW_PADDING * 2,
+                        box.height + SHADOW_PADDING * 2)
+            shadow = get_shadow(self, size, *args, **kwargs)
+            self.paste(shadow, XY(dx, dy), shadow)
 
     return func
 
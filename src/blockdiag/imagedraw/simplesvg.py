@@ -13,8 +13,21 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import re
-from io import StringIO
+from functools import lru_cache
+from io import StringIO, TextIOBase
+
+
+@lru_cache(maxsize=None)
+def _attrname(key):
+    return key.replace('_', '-')
+
+
+def _writer(fp):
+    """Return a function writing str to text/binary file-like or socket"""
+    if isinstance(fp, (StringIO, TextIOBase)):
+        return fp.write
+    else:
+        return lambda s: fp.write(s.encode('utf-8'))
 
 
 def _escape(s):
@@ -28,6 +41,8 @@ def _quote(s):
 
 
 class base(object):
+    __slots__ = ('text', 'elements', 'attributes')
+
     def __init__(self, *args, **kwargs):
         self.text = None
         self.elements = []
@@ -36,12 +51,11 @@ class base(object):
             self.add_attribute(key, value)
 
     def add_attribute(self, key, value):
-        setter = 'set_%s' % key
-        if hasattr(self, setter):
-            getattr(self, setter)(value)
+        setter = getattr(self, 'set_%s' % key, None)
+        if setter:
+            setter(value)
         else:
-            key = re.sub('_', '-', key)
-            self.attributes[key] = value
+            self.attributes[_attrname(key)] = value
 
     def addElement(self, element):
         self.elements.append(element)
@@ -50,32 +64,36 @@ class base(object):
         self.text = text
 
     def to_xml(self, io, level=0):
+        self._write(_writer(io), level)
+
+    def _write(self, write, level):
         clsname = self.__class__.__name__
         indent = '  ' * level
 
-        io.write('%s<%s' % (indent, clsname))
-        for key in sorted(self.attributes):
-            value = self.attributes[key]
-            if value is not None:
-                io.write(' %s=%s' % (_escape(key), _quote(value)))
-
+        attrs = ''.join(' %s=%s' % (_escape(key), _quote(value))
+                        for key, value in sorted(self.attributes.items())
+                        if value is not None)
         if self.elements == []:
             if self.text is not None:
-                io.write(">%s</%s>\n" % (_escape(self.text), clsname))
+                write('%s<%s%s>%s</%s>\n' % (indent, clsname, attrs,
+                                             _escape(self.text), clsname))
             else:
-                io.write(" />\n")
+                write('%s<%s%s />\n' % (indent, clsname, attrs))
         elif self.elements:
             if self.text is not None:
-                io.write(">%s\n" % (_escape(self.text),))
+                write('%s<%s%s>%s\n' % (indent, clsname, attrs,
+                                        _escape(self.text)))
             else:
-                io.write(">\n")
+                write('%s<%s%s>\n' % (indent, clsname, attrs))
 
             for e in self.elements:
-                e.to_xml(io, level + 1)
-            io.write('%s</%s>\n' % (indent, clsname))
+                e._write(write, level + 1)
+            write('%s</%s>\n' % (indent, clsname))
 
 
 class element(base):
+    __slots__ = ()
+
     def __init__(self, x, y, width=None, height=None, *args, **kwargs):
         super(element, self).__init__(*args, **kwargs)
         self.attributes['x'] = x
@@ -87,6 +105,8 @@ class element(base):
 
 
 class svg(base):
+    __slots__ = ('nodoctype',)
+
     def __init__(self, x, y, width, height, **kwargs):
         if kwargs.get('noviewbox'):
             super(svg, self).__init__(width=(width - x), height=(height - y))
@@ -97,56 +117,82 @@ class svg(base):
         self.nodoctype = kwargs.get('nodoctype', False)
         self.add_attribute('xmlns', 'http://www.w3.org/2000/svg')
 
-    def to_xml(self):
-        io = StringIO()
+    def to_xml(self, io=None):
+        """Serialize the document.
+
+        If ``io`` (a text or binary file-like object, or a socket) is
+        given, the document is written to it incrementally.  Otherwise,
+        it is returned as a string.
+        """
+        if io is None:
+            io = StringIO()
+            self.to_xml(io)
+            return io.getvalue()
 
+        if hasattr(io, 'sendall'):  # socket
+            with io.makefile('wb') as fp:
+                return self.to_xml(fp)
+
+        write = _writer(io)
         if not self.nodoctype:
             url = "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd"
-            io.write("<?xml version='1.0' encoding='UTF-8'?>\n")
-            io.write('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN" "%s">\n' % url)
-
-        super(svg, self).to_xml(io)
+            write("<?xml version='1.0' encoding='UTF-8'?>\n")
+            write('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN" "%s">\n' % url)
 
-        return io.getvalue()
+        self._write(write, 0)
 
 
 class title(base):
+    __slots__ = ()
+
     def __init__(self, _title):
         super(title, self).__init__(text=_title)
 
 
 class desc(base):
+    __slots__ = ()
+
     def __init__(self, _title):
         super(desc, self).__init__(text=_title)
 
 
 class text(element):
+    __slots__ = ()
+
     def __init__(self, x, y, _text, **kwargs):
         super(text, self).__init__(x, y, text=_text, **kwargs)
 
 
 class rect(element):
-    pass
+    __slots__ = ()
 
 
 class ellipse(base):
+    __slots__ = ()
+
     def __init__(self, cx, cy, rx, ry, **kwargs):
         super(ellipse, self).__init__(cx=cx, cy=cy, rx=rx, ry=ry, **kwargs)
 
 
 class image(element):
+    __slots__ = ()
+
     def __init__(self, uri, x, y, width, height, **kwargs):
         super(image, self).__init__(x, y, width, height, **kwargs)
         self.add_attribute('xlink:href', uri)
 
 
 class polygon(base):
+    __slots__ = ()
+
     def __init__(self, points, **kwargs):
         xylist = " ".join('%d,%d' % pt for pt in points)
         super(polygon, self).__init__(points=xylist, **kwargs)
 
 
 class path(base):
+    __slots__ = ()
+
     def __init__(self, data, **kwargs):
         super(path, self).__init__(d=data, **kwargs)
 
@@ -221,22 +267,24 @@ class pathdata:
 
 
 class defs(base):
-    pass
+    __slots__ = ()
 
 
 class g(base):
-    pass
+    __slots__ = ()
 
 
 class a(base):
-    pass
+    __slots__ = ()
 
 
 class filter(element):
+    __slots__ = ()
+
     def __init__(self, x, y, width, height, **kwargs):
         super(filter, self).__init__(x, y, width, height, **kwargs)
 
 
 def svgclass(name):
     """ svg class generating function """
-    return type(name, (base,), {})
+    return type(name, (base,), {'__slots__': ()})
@@ -23,7 +23,7 @@ from blockdiag.imagedraw import base as _base
 from blockdiag.imagedraw.simplesvg import (a, defs, desc, ellipse, filter, g,
                                            image, path, pathdata, polygon,
                                            rect, svg, svgclass, text, title)
-from blockdiag.imagedraw.utils import memoize
+from blockdiag.imagedraw.utils import textsize
 from blockdiag.imagedraw.utils.ellipse import endpoints as ellipse_endpoints
 from blockdiag.utils import XY, Box, images, is_Pillow_available
 
@@ -106,18 +106,20 @@ class SVGImageDrawElement(_base.ImageDraw):
                  stroke_width=thick, **drawing_params(kwargs))
         self.svg.addElement(r)
 
-    @memoize
     def textlinesize(self, string, font, **kwargs):
         if is_Pillow_available():
-            if not hasattr(self, '_pil_drawer'):
-                from blockdiag.imagedraw import png
-                self._pil_drawer = png.ImageDrawEx(None)
-
-            return self._pil_drawer.textlinesize(string, font)
+            from blockdiag.imagedraw.png import measurer
+            return measurer.textlinesize(string, font)
         else:
-            from blockdiag.imagedraw.utils import textsize
             return textsize(string, font)
 
+    def textlinesizes(self, strings, font):
+        if is_Pillow_available():
+            from blockdiag.imagedraw.png import measurer
+            return measurer.textlinesizes(strings, font)
+        else:
+            return [textsize(string, font) for string in strings]
+
     def text(self, point, string, font, **kwargs):
         fill = kwargs.get('fill')
 
@@ -308,10 +310,17 @@ class SVGImageDraw(SVGImageDrawElement):
             self.svg.attributes['width'] = size[0]
             self.svg.attributes['height'] = size[1]
 
+        if hasattr(self.filename, 'write') or \
+                hasattr(self.filename, 'sendall'):
+            # streamed into file-like objects (and sockets)
+            self.svg.to_xml(self.filename)
+            return None
+
         image = self.svg.to_xml()
 
         if self.filename:
-            open(self.filename, 'wb').write(image.encode('utf-8'))
+            with open(self.filename, 'wb') as fp:
+                fp.write(image.encode('utf-8'))
 
         return image
 
@@ -32,29 +32,48 @@ def splitlabel(string):
         yield re.sub('\x00', '\\\\', line).strip()
 
 
+def fitting_length(metrics, text, bound, measure='width', suffix=''):
+    """Find the length of the longest head of text fitting to bound.
+       Measured size of text is assumed to grow with its length,
+       so the length is found by binary search.
+    """
+    textsize = metrics.textsize(text + suffix)
+    if getattr(textsize, measure) <= bound:
+        return len(text)
+
+    lower, upper = 0, len(text) - 1
+    while lower < upper:
+        i = (lower + upper + 1) // 2
+        textsize = metrics.textsize(text[0:i] + suffix)
+
+        if getattr(textsize, measure) <= bound:
+            lower = i
+        else:
+            upper = i - 1
+
+    return lower
+
+
 def splittext(metrics, text, bound, measure='width'):
     folded = []
     if text == '':
         folded.append(' ')
 
-    for i in range(len(text), 0, -1):
-        textsize = metrics.textsize(text[0:i])
-
-        if getattr(textsize, measure) <= bound:
-            folded.append(text[0:i])
-            if text[i:]:
-                folded += splittext(metrics, text[i:], bound, measure)
+    while text:
+        i = fitting_length(metrics, text, bound, measure)
+        if i == 0:
             break
 
+        folded.append(text[0:i])
+        text = text[i:]
+
     return folded
 
 
 def truncate_text(metrics, text, bound, measure='width'):
-    for i in range(len(text), 0, -1):
-        textsize = metrics.textsize(text[0:i] + ' ...')
-
-        if getattr(textsize, measure) <= bound:
-            return text[0:i] + ' ...'
+    i = fitting_length(metrics, text, bound, measure, suffix=' ...')
+    if i > 0:
+        return text[0:i] + ' ...'
 
     return text
 
@@ -87,7 +106,7 @@ class VerticalTextFolder(object):
 
     def textsize(self, text, scaled=False):
         if isinstance(text, str):
-            size = [self.drawer.textlinesize(c, self.font) for c in text]
+            size = self.drawer.textlinesizes(text, self.font)
             width = max(s.width for s in size)
             height = (sum(s.height for s in size) +
                       self.line_spacing * (len(text) - 1))
@@ -14,10 +14,13 @@
 #  limitations under the License.
 
 import math
+import threading
 import unicodedata
+from collections import OrderedDict
 from functools import wraps
 
 from blockdiag.utils import Size
+from blockdiag.utils.fontmap import parse_fontpath
 
 
 def is_zenkaku(char):
@@ -55,15 +58,75 @@ def textsize(string, font):
     return Size(int(math.ceil(width)), font.size)
 
 
-def memoize(fn):
-    fn.cache = {}
+class TextMetricsCache(object):
+    """LRU cache for measured text sizes.
 
+    The cache is shared by all drawers of this process.  ``maxsize`` limits
+    the number of entries (``None`` for unlimited).
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            else:
+                self.misses += 1
+                return default
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.evict()
+
+    def resize(self, maxsize):
+        with self.lock:
+            self.maxsize = maxsize
+            self.evict()
+
+    def evict(self):
+        if self.maxsize is not None:
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+textmetrics = TextMetricsCache()
+
+
+def textmetrics_key(namespace, string, font):
+    path, index = parse_fontpath(font.path)
+    return (namespace, path, index, font.size, string)
+
+
+def memoize_textsize(fn):
+    """Cache results of textlinesize() by font identity and string"""
     @wraps(fn)
-    def func(*args, **kwargs):
-        key = str(args) + str(kwargs)
-        if key not in fn.cache:
-            fn.cache[key] = fn(*args, **kwargs)
+    def func(self, string, font, **kwargs):
+        key = textmetrics_key(fn.__module__, string, font)
+
+        size = textmetrics.get(key)
+        if size is None:
+            size = fn(self, string, font, **kwargs)
+            textmetrics.set(key, size)
 
-        return fn.cache[key]
+        return size
 
     return func
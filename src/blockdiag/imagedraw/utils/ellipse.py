@@ -44,11 +44,10 @@ def endpoints(du, a, b, start, end):
 def dots(box, cycle, start=0, end=360):
     # calcrate rendering pattern from cycle
     base = 0
-    rendered = []
+    rendered = set()
     for index in range(0, len(cycle), 2):
         i, j = cycle[index:index + 2]
-        for n in range(base * 2, (base + i) * 2):
-            rendered.append(n)
+        rendered.update(range(base * 2, (base + i) * 2))
         base += i + j
 
     a = float(box.width) / 2
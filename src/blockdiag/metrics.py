@@ -19,7 +19,6 @@ import copy
 from collections import defaultdict
 
 from blockdiag import noderenderer
-from blockdiag.elements import DiagramNode
 from blockdiag.utils import XY, Box, Size
 from blockdiag.utils.fontmap import FontInfo, FontMap
 
@@ -69,6 +68,35 @@ class EdgeLines(object):
         return lines
 
 
+def freeze(value):
+    """Convert lists (and polylines of EdgeLines) to tuples"""
+    if isinstance(value, EdgeLines):
+        lines = EdgeLines()
+        lines.polylines = tuple(tuple(line) for line in value.polylines)
+        return lines
+    elif type(value) is list:  # Box is also a list
+        return tuple(freeze(item) for item in value)
+    else:
+        return value
+
+
+class MemoizedMetrics(object):
+    """Proxy of a metrics object computing each attribute only once.
+       Computed values are frozen so as not to be modified by readers.
+    """
+
+    def __init__(self, subject):
+        self.subject = subject
+
+    def __getattr__(self, name):
+        value = getattr(self.subject, name)
+        if not callable(value):
+            value = freeze(value)
+            setattr(self, name, value)
+
+        return value
+
+
 class AutoScaler(object):
     def __init__(self, subject, scale_ratio):
         self.subject = subject
@@ -168,23 +196,37 @@ class DiagramMetrics(object):
         if diagram.edge_layout is not None:
             self.edge_layout = diagram.edge_layout
 
+        # metrics of elements; cleared when the spreadsheet is changed
+        self.cache = {}
+
         # setup spreadsheet
         sheet = self.spreadsheet = SpreadSheetMetrics(self)
         nodes = [n for n in diagram.traverse_nodes() if n.drawable]
 
-        node_width = self.node_width
-        for x in range(diagram.colwidth):
-            widths = [n.width for n in nodes if n.xy.x == x]
-            if widths:
-                width = max(n or node_width for n in widths)
-                sheet.set_node_width(x, width)
+        widths = defaultdict(int)
+        heights = defaultdict(int)
+        for node in nodes:
+            x, y = node.xy
+            widths[x] = max(widths[x], node.width or self.node_width)
+            heights[y] = max(heights[y], node.height or self.node_height)
+
+        for x in sorted(widths):
+            if 0 <= x < diagram.colwidth:
+                sheet.set_node_width(x, widths[x])
+
+        for y in sorted(heights):
+            if 0 <= y < diagram.colheight:
+                sheet.set_node_height(y, heights[y])
+
+    def __copy__(self):
+        # the spreadsheet and metrics of elements are not shared
+        metrics = self.__class__.__new__(self.__class__)
+        metrics.__dict__.update(self.__dict__)
+        metrics.cache = {}
+        metrics.spreadsheet = copy.copy(self.spreadsheet)
+        metrics.spreadsheet.metrics = metrics
 
-        node_height = self.node_height
-        for y in range(diagram.colheight):
-            heights = [n.height for n in nodes if n.xy.y == y]
-            if heights:
-                height = max(n or node_height for n in heights)
-                sheet.set_node_height(y, height)
+        return metrics
 
     @property
     def original_metrics(self):
@@ -192,8 +234,6 @@ class DiagramMetrics(object):
 
     def shift(self, x, y):
         metrics = copy.copy(self)
-        metrics.spreadsheet = copy.copy(self.spreadsheet)
-        metrics.spreadsheet.metrics = metrics
         metrics.page_margin = XY(x, y)
 
         return metrics
@@ -202,30 +242,44 @@ class DiagramMetrics(object):
         return self.drawer.textsize(string, font, maxwidth=width)
 
     def node(self, node):
-        renderer = noderenderer.get(node.shape)
+        key = ('node', node)
+        if key not in self.cache:
+            renderer = noderenderer.get(node.shape)
 
-        if hasattr(renderer, 'render'):
-            return renderer(node, self)
-        else:
-            return self.cell(node)
+            if hasattr(renderer, 'render'):
+                self.cache[key] = renderer(node, self)
+            else:
+                self.cache[key] = self.cell(node)
+
+        return self.cache[key]
 
     def cell(self, node, use_padding=True):
-        return self.spreadsheet.node(node, use_padding)
+        key = ('cell', node, use_padding)
+        if key not in self.cache:
+            self.cache[key] = self.spreadsheet.node(node, use_padding)
+
+        return self.cache[key]
 
     def group(self, group):
-        return self.spreadsheet.node(group, use_padding=False)
+        return self.cell(group, use_padding=False)
 
     def edge(self, edge):
-        if self.edge_layout == 'flowchart':
-            if edge.node1.group.orientation == 'landscape':
-                return FlowchartLandscapeEdgeMetrics(edge, self)
-            else:
-                return FlowchartPortraitEdgeMetrics(edge, self)
-        else:
-            if edge.node1.group.orientation == 'landscape':
-                return LandscapeEdgeMetrics(edge, self)
+        key = ('edge', edge)
+        if key not in self.cache:
+            if self.edge_layout == 'flowchart':
+                if edge.node1.group.orientation == 'landscape':
+                    metrics = FlowchartLandscapeEdgeMetrics(edge, self)
+                else:
+                    metrics = FlowchartPortraitEdgeMetrics(edge, self)
             else:
-                return PortraitEdgeMetrics(edge, self)
+                if edge.node1.group.orientation == 'landscape':
+                    metrics = LandscapeEdgeMetrics(edge, self)
+                else:
+                    metrics = PortraitEdgeMetrics(edge, self)
+
+            self.cache[key] = MemoizedMetrics(metrics)
+
+        return self.cache[key]
 
     def font_for(self, element):
         return self.fontmap.find(element)
@@ -250,32 +304,69 @@ class SpreadSheetMetrics(SubMetrics):
         self.node_height = defaultdict(lambda: metrics.node_height)
         self.span_width = defaultdict(lambda: metrics.span_width)
         self.span_height = defaultdict(lambda: metrics.span_height)
+        self.offsets = defaultdict(lambda: [0])
+
+    def __copy__(self):
+        # sizes and their cumulative sums are not shared
+        sheet = self.__class__.__new__(self.__class__)
+        sheet.__dict__.update(self.__dict__)
+        for name in ('node_width', 'node_height', 'span_width',
+                     'span_height'):
+            setattr(sheet, name, copy.copy(getattr(self, name)))
+
+        sheet.offsets = defaultdict(lambda: [0])
+        for name, offsets in self.offsets.items():
+            sheet.offsets[name] = list(offsets)
+
+        return sheet
+
+    def offset(self, name, index):
+        """Return the sum of sizes in the table before index.
+           Cumulative sums are extended on demand and truncated by
+           set_*() and add_*() methods.
+        """
+        table = getattr(self, name)
+        offsets = self.offsets[name]
+        while len(offsets) <= index:
+            offsets.append(offsets[-1] + table[len(offsets) - 1])
+
+        return offsets[index]
+
+    def invalidate(self, name, index):
+        del self.offsets[name][index + 1:]
+        self.metrics.cache.clear()
 
     def set_node_width(self, x, width):
         if (width is not None and 0 < width and
            (x not in self.node_width or self.node_width[x] < width)):
             self.node_width[x] = width
+            self.invalidate('node_width', x)
 
     def set_node_height(self, y, height):
         if (height is not None and 0 < height and
            (y not in self.node_height or self.node_height[y] < height)):
             self.node_height[y] = height
+            self.invalidate('node_height', y)
 
     def set_span_width(self, x, width):
         if (width is not None and 0 < width and
            (x not in self.span_width or self.span_width[x] < width)):
             self.span_width[x] = width
+            self.invalidate('span_width', x)
 
     def add_span_width(self, x, width):
         self.span_width[x] += width
+        self.invalidate('span_width', x)
 
     def set_span_height(self, y, height):
         if (height is not None and 0 < height and
            (y not in self.span_height or self.span_height[y] < height)):
             self.span_height[y] = height
+            self.invalidate('span_height', y)
 
     def add_span_height(self, y, height):
         self.span_height[y] += height
+        self.invalidate('span_height', y)
 
     def node(self, node, use_padding=True):
         x1, y1 = self._node_topleft(node, use_padding)
@@ -288,10 +379,10 @@ class SpreadSheetMetrics(SubMetrics):
         margin = self.page_margin
         padding = self.page_padding
 
-        node_width = sum(self.node_width[i] for i in range(x))
-        node_height = sum(self.node_height[i] for i in range(y))
-        span_width = sum(self.span_width[i] for i in range(x + 1))
-        span_height = sum(self.span_height[i] for i in range(y + 1))
+        node_width = self.offset('node_width', x)
+        node_height = self.offset('node_height', y)
+        span_width = self.offset('span_width', x + 1)
+        span_height = self.offset('span_height', y + 1)
 
         if use_padding:
             width = node.width or self.metrics.node_width
@@ -318,10 +409,10 @@ class SpreadSheetMetrics(SubMetrics):
         margin = self.page_margin
         padding = self.page_padding
 
-        node_width = sum(self.node_width[i] for i in range(x + 1))
-        node_height = sum(self.node_height[i] for i in range(y + 1))
-        span_width = sum(self.span_width[i] for i in range(x + 1))
-        span_height = sum(self.span_height[i] for i in range(y + 1))
+        node_width = self.offset('node_width', x + 1)
+        node_height = self.offset('node_height', y + 1)
+        span_width = self.offset('span_width', x + 1)
+        span_height = self.offset('span_height', y + 1)
 
         if use_padding:
             width = node.width or self.metrics.node_width
@@ -346,9 +437,10 @@ class SpreadSheetMetrics(SubMetrics):
         margin = self.metrics.page_margin
         padding = self.metrics.page_padding
 
-        dummy = DiagramNode(None)
-        dummy.xy = XY(width - 1, height - 1)
-        x, y = self._node_bottomright(dummy, use_padding=False)
+        x = (margin.x + padding[3] + self.offset('node_width', width) +
+             self.offset('span_width', width))
+        y = (margin.y + padding[0] + self.offset('node_height', height) +
+             self.offset('span_height', height))
         x_span = self.span_width[width]
         y_span = self.span_height[height]
         return Size(x + margin.x + padding[1] + x_span,
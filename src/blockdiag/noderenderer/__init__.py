@@ -15,17 +15,36 @@
 
 from __future__ import division
 
-import pkg_resources
+import threading
+
+from blockdiag.utils import entrypoints
 
 renderers = {}
 searchpath = []
+loaded = set()
+init_lock = threading.Lock()
+
+
+def load_renderer(name):
+    """Load the noderenderer registered as entry point ``name``"""
+    if name in loaded:
+        return
+
+    plugin = entrypoints.get('blockdiag_noderenderer').get(name)
+    if plugin is None:
+        return
+
+    with init_lock:
+        if name not in loaded:
+            module = plugin.load()
+            if hasattr(module, 'setup'):
+                module.setup(module)
+            loaded.add(name)
 
 
 def init_renderers():
-    for plugin in pkg_resources.iter_entry_points('blockdiag_noderenderer'):
-        module = plugin.load()
-        if hasattr(module, 'setup'):
-            module.setup(module)
+    for name in entrypoints.get('blockdiag_noderenderer'):
+        load_renderer(name)
 
 
 def install_renderer(name, renderer):
@@ -38,13 +57,20 @@ def set_default_namespace(path):
         searchpath.append(path)
 
 
-def get(shape):
-    if not renderers:
-        init_renderers()
+def find(name):
+    if name not in renderers:
+        load_renderer(name)
+        if name not in renderers:
+            # the renderer might be installed by an entry point of other name
+            init_renderers()
+
+    return renderers.get(name)
 
+
+def get(shape):
     for path in searchpath:
-        name = "%s.%s" % (path, shape)
-        if name in renderers:
-            return renderers[name]
+        renderer = find("%s.%s" % (path, shape))
+        if renderer:
+            return renderer
 
-    return renderers.get(shape)
+    return find(shape)
@@ -13,8 +13,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from pkg_resources import iter_entry_points
-
+from blockdiag.utils import entrypoints
 from blockdiag.utils.logging import warning
 
 loaded_plugins = []
@@ -22,22 +21,41 @@ node_handlers = []
 general_handlers = {}
 
 
+def get_loaded_plugins(element):
+    """Plugins loaded to the build context of element (or process-wide)"""
+    context = getattr(element, 'context', None)
+    if context is None:
+        return loaded_plugins
+    else:
+        return context.loaded_plugins
+
+
+def get_node_handlers(element):
+    """Node handlers of the build context of element (or process-wide)"""
+    context = getattr(element, 'context', None)
+    if context is None:
+        return node_handlers
+    else:
+        return context.node_handlers
+
+
 def load(plugins, diagram, **kwargs):
+    loaded = get_loaded_plugins(diagram)
     for name in plugins:
-        if name in loaded_plugins:
+        if name in loaded:
             warning('plugin "%s" is already loaded. ignored.', name)
             return
 
-        for ep in iter_entry_points('blockdiag_plugins', name):
-            module = ep.load()
-            loaded_plugins.append(name)
-            if hasattr(module, 'setup'):
-                module.setup(module, diagram, **kwargs)
-            break
-        else:
+        ep = entrypoints.get('blockdiag_plugins').get(name)
+        if ep is None:
             msg = "unknown plugin: %s" % name
             raise AttributeError(msg)
 
+        module = ep.load()
+        loaded.append(name)
+        if hasattr(module, 'setup'):
+            module.setup(module, diagram, **kwargs)
+
 
 def install_general_handler(name, handler):
     if name not in general_handlers:
@@ -52,12 +70,14 @@ def fire_general_event(name, *args):
 
 
 def install_node_handler(handler):
-    if handler not in node_handlers:
-        node_handlers.append(handler)
+    handlers = get_node_handlers(getattr(handler, 'diagram', None))
+    if handler not in handlers:
+        handlers.append(handler)
 
 
 def fire_node_event(node, name, *args):
-    return all(handler.fire(name, node, *args) for handler in node_handlers)
+    return all(handler.fire(name, node, *args)
+               for handler in get_node_handlers(node))
 
 
 class NodeHandler(object):
@@ -12,3 +12,28 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+
+import os
+import shutil
+from tempfile import mkdtemp
+
+environ = {}
+
+
+def setup_package():
+    # keep caches of tests (e.g. FontCache) out of the user cache directory
+    environ['XDG_CACHE_HOME'] = os.environ.get('XDG_CACHE_HOME')
+    os.environ['XDG_CACHE_HOME'] = mkdtemp()
+
+
+def teardown_package():
+    shutil.rmtree(os.environ['XDG_CACHE_HOME'], ignore_errors=True)
+    if environ['XDG_CACHE_HOME'] is None:
+        del os.environ['XDG_CACHE_HOME']
+    else:
+        os.environ['XDG_CACHE_HOME'] = environ['XDG_CACHE_HOME']
+
+
+# for pytest
+setup_module = setup_package
+teardown_module = teardown_package
@@ -848,3 +848,33 @@ class TestRstDirectives(unittest.TestCase):
         doctree = publish_doctree(text)
         self.assertEqual(1, len(doctree))
         self.assertEqual(nodes.system_message, type(doctree[0]))
+
+    def test_cachedir_option(self):
+        from unittest.mock import patch
+
+        from blockdiag.utils.rst.nodes import blockdiag as blockdiag_node
+
+        text = (".. blockdiag::\n"
+                "\n"
+                "   A -> B")
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        outputs = []
+        for i in range(2):
+            outputdir = os.path.join(self.tmpdir, str(i))
+            os.mkdir(outputdir)
+            directives.setup(format='SVG', outputdir=outputdir,
+                             cachedir=cachedir)
+            if i == 0:
+                doctree = publish_doctree(text)
+            else:
+                # cached image is used without parsing the diagram
+                with patch.object(blockdiag_node, 'to_diagram',
+                                  side_effect=AssertionError):
+                    doctree = publish_doctree(text)
+
+            self.assertEqual(nodes.image, type(doctree[0]))
+            with open(doctree[0]['uri']) as fp:
+                outputs.append(fp.read())
+
+        self.assertEqual(1, len(os.listdir(cachedir)))
+        self.assertEqual(outputs[0], outputs[1])
@@ -174,6 +174,46 @@ class TestBootParams(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             self.parser.parse(['--size', 'foobar', 'input.diag'])
 
+    def test_multiple_inputs(self):
+        options = self.parser.parse(['-Tsvg', 'input1.diag', 'input2.diag'])
+        self.assertEqual(['input1.diag', 'input2.diag'], options.inputs)
+        self.assertEqual(['input1.svg', 'input2.svg'], options.outputs)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            options = self.parser.parse(['-o', tmpdir, 'path/input1.diag',
+                                         'input2.diag'])
+            self.assertEqual([os.path.join(tmpdir, 'input1.png'),
+                              os.path.join(tmpdir, 'input2.png')],
+                             options.outputs)
+
+            # manifest file and wildcards
+            for name in ('a.diag', 'b.diag', 'c.txt'):
+                io.open(os.path.join(tmpdir, name), 'w').close()
+
+            manifest = os.path.join(tmpdir, 'manifest')
+            with io.open(manifest, 'w') as fp:
+                fp.write(u'# comment\ninput1.diag\n\n%s\n' %
+                         os.path.join(tmpdir, '*.diag'))
+
+            options = self.parser.parse(['@' + manifest])
+            self.assertEqual(['input1.diag', os.path.join(tmpdir, 'a.diag'),
+                              os.path.join(tmpdir, 'b.diag')],
+                             options.inputs)
+        finally:
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+
+    def test_multiple_inputs_with_output_file(self):
+        with self.assertRaises(RuntimeError):
+            self.parser.parse(['-o', 'output.png', 'input1.diag',
+                               'input2.diag'])
+
+    def test_no_inputs_matched(self):
+        with self.assertRaises(RuntimeError):
+            self.parser.parse(['/path/to/not_exist/*.diag'])
+
     def test_not_exist_fontmap_config(self):
         with self.assertRaises(RuntimeError):
             args = ['--fontmap', '/fontmap_is_not_exist', 'input.diag']
@@ -13,6 +13,8 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from blockdiag.builder import DiagramLayoutManager, ScreenNodeBuilder
+from blockdiag.parser import parse_string
 from blockdiag.tests.utils import BuilderTestCase
 
 
@@ -169,3 +171,119 @@ class TestBuilder(BuilderTestCase):
                                        ('B', 'C'): (0, 0, 0)})
         self.assertEdgeStyle(diagram, {('A', 'B'): 'dashed',
                                        ('B', 'C'): None})
+
+    def test_diagrams_do_not_share_defaults(self):
+        diagram1 = self.build('diagram_attributes.diag')
+        diagram2 = self.build('single_node.diag')
+
+        self.assertEqual('diamond', diagram1.nodes[0].shape)
+        self.assertEqual((255, 0, 0), diagram1.nodes[0].color)
+        self.assertEqual('box', diagram2.nodes[0].shape)
+        self.assertEqual((255, 255, 255), diagram2.nodes[0].color)
+        self.assertIsNot(diagram1.context, diagram2.context)
+
+    def test_build_diagrams_concurrently(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        filenames = ['diagram_attributes.diag', 'define_class.diag',
+                     'twin_forked.diag', 'single_node.diag'] * 8
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            diagrams = list(executor.map(self.build, filenames))
+
+        def summarize(diagram):
+            return [(n.id, n.xy, n.shape, n.color)
+                    for n in diagram.traverse_nodes() if n.drawable]
+
+        for filename, diagram in zip(filenames, diagrams):
+            expected = self.build(filename)
+            self.assertEqual(summarize(expected), summarize(diagram))
+
+    def test_plugins_do_not_leak_to_other_diagrams(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def build(source):
+            return self._build(parse_string(source))
+
+        plugin = "{ plugin autoclass; class emphasis [color = red]; A_emphasis }"
+        plain = "{ B_emphasis }"
+        diagram1 = build(plugin)
+        diagram2 = build(plain)
+        self.assertEqual(('A', (255, 0, 0)),
+                         (diagram1.nodes[0].label, diagram1.nodes[0].color))
+        self.assertEqual(('B_emphasis', (255, 255, 255)),
+                         (diagram2.nodes[0].label, diagram2.nodes[0].color))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            diagrams = list(executor.map(build, [plugin, plain] * 8))
+
+        labels = [d.nodes[0].label for d in diagrams]
+        self.assertEqual(['A', 'B_emphasis'] * 8, labels)
+
+    def test_layout_plain_elements(self):
+        from blockdiag.elements import Diagram, DiagramEdge, DiagramNode
+
+        try:
+            diagram = Diagram()
+            node1 = DiagramNode.get('A')
+            node2 = DiagramNode.get('B')
+            for node in (node1, node2):
+                node.group = diagram
+                diagram.nodes.append(node)
+            diagram.edges.append(DiagramEdge.get(node1, node2))
+
+            # layouts with the context wrapping plain element classes
+            DiagramLayoutManager(diagram).run()
+            self.assertEqual((0, 0), node1.xy)
+            self.assertEqual((1, 0), node2.xy)
+        finally:
+            DiagramNode.clear()
+            DiagramEdge.clear()
+
+    def test_merged_circulars(self):
+        # C -> B -> A is not in sorted order, and B is shared by two cycles
+        tree = parse_string("""
+                            blockdiag {
+                              A -> C -> B -> A;
+                              B -> D -> B;
+                              Z;
+                            }
+                            """)
+        diagram = ScreenNodeBuilder(tree, None, False).diagram
+        manager = DiagramLayoutManager(diagram)
+        manager.run()
+
+        circulars = [[node.id for node in c] for c in manager.circulars]
+        self.assertEqual([['A', 'C', 'B', 'B', 'D']], circulars)
+        self.assertNodeXY(diagram, {'A': (0, 0), 'B': (2, 0),
+                                    'C': (1, 0), 'D': (3, 0),
+                                    'Z': (0, 1)})
+
+    def test_circular_entered_from_other_node(self):
+        # the circular is ordered from B, where C enters it last
+        tree = parse_string("""
+                            blockdiag {
+                              A -> B -> A;
+                              C -> A;
+                              C -> B;
+                            }
+                            """)
+        diagram = ScreenNodeBuilder(tree, None, False).diagram
+        manager = DiagramLayoutManager(diagram)
+        manager.run()
+
+        circulars = [[node.id for node in c] for c in manager.circulars]
+        self.assertEqual([['B', 'A']], circulars)
+        self.assertNodeXY(diagram, {'A': (2, 0), 'B': (1, 1), 'C': (0, 0)})
+
+    def test_densely_circular_diagram(self):
+        # every node links to all others; too many circular paths to search
+        nodes = ['N%d' % i for i in range(8)]
+        edges = ['%s -> %s;' % (n1, n2)
+                 for n1 in nodes for n2 in nodes if n1 != n2]
+        tree = parse_string("blockdiag { %s }" % ' '.join(edges))
+        diagram = ScreenNodeBuilder(tree, None, False).diagram
+        manager = DiagramLayoutManager(diagram)
+        manager.run()
+
+        self.assertEqual([sorted(nodes)],
+                         [sorted(n.id for n in c) for c in manager.circulars])
@@ -154,3 +154,23 @@ class TestBuilderEdge(BuilderTestCase):
         diagram = self.build('skipped_edge_portrait_flowchart_rightdown2.diag')
         self.assertEdgeSkipped(diagram, {('B', 'C'): False,
                                          ('A', 'C'): True})
+
+    def test_find_edges_of_group(self):
+        diagram = self.build('separate2.diag')
+        DiagramEdge = diagram.context.DiagramEdge
+
+        def ids(edges):
+            return sorted((e.node1.id, e.node2.id) for e in edges)
+
+        for group in diagram.traverse_groups():
+            # same as scanning all edges
+            incoming = [e for e in DiagramEdge.find_all()
+                        if e.node2.group.is_parent(group) and
+                        not e.node1.group.is_parent(group)]
+            outgoing = [e for e in DiagramEdge.find_all()
+                        if e.node1.group.is_parent(group) and
+                        not e.node2.group.is_parent(group)]
+            self.assertEqual(ids(incoming),
+                             ids(DiagramEdge.find(None, group)))
+            self.assertEqual(ids(outgoing),
+                             ids(DiagramEdge.find(group, None)))
@@ -17,7 +17,7 @@ import os
 import unittest
 
 from blockdiag.command import BlockdiagApp
-from blockdiag.tests.utils import TemporaryDirectory
+from blockdiag.tests.utils import TemporaryDirectory, with_pil
 
 
 class TestBlockdiagApp(unittest.TestCase):
@@ -69,8 +69,194 @@ class TestBlockdiagApp(unittest.TestCase):
             app.register_cleanup_handler(cleanup)  # to get internal state
             app.run(args)
 
+            with open(tmpfile) as fp:
+                self.assertIn('>A</text>', fp.read())  # autoclass is applied
+
+            # plugins are loaded to the build context, not process-wide
             from blockdiag import plugins
-            self.assertTrue(loaded_plugins)  # check plugins were loaded
-            self.assertFalse(plugins.loaded_plugins)  # and unloaded finally
+            self.assertFalse(loaded_plugins)
+            self.assertFalse(plugins.loaded_plugins)
+            self.assertFalse(plugins.node_handlers)
+        finally:
+            tmpdir.clean()
+
+    def test_app_reuses_cached_images(self):
+        testdir = os.path.dirname(__file__)
+        diagpath = os.path.join(testdir, 'diagrams', 'single_node.diag')
+
+        try:
+            tmpdir = TemporaryDirectory()
+            cachedir = os.path.join(tmpdir.name, 'cache')
+            output1 = os.path.join(tmpdir.name, 'output1.svg')
+            output2 = os.path.join(tmpdir.name, 'output2.svg')
+
+            args = ['-T', 'SVG', '--cache-dir', cachedir, diagpath]
+            self.assertEqual(0, BlockdiagApp().run(['-o', output1] + args))
+            self.assertEqual(1, len(os.listdir(cachedir)))
+
+            # cache hit: diagram is not parsed again
+            app = BlockdiagApp()
+            app.parse_diagram = None
+            self.assertEqual(0, app.run(['-o', output2] + args))
+
+            with open(output1) as fp1, open(output2) as fp2:
+                self.assertEqual(fp1.read(), fp2.read())
+
+            # another format is cached separately
+            args = ['-T', 'PNG', '--cache-dir', cachedir, diagpath]
+            output3 = os.path.join(tmpdir.name, 'output3.png')
+            self.assertEqual(0, BlockdiagApp().run(['-o', output3] + args))
+            self.assertEqual(2, len(os.listdir(cachedir)))
+        finally:
+            tmpdir.clean()
+
+    def test_app_renders_multiple_files(self):
+        testdir = os.path.dirname(__file__)
+        diagrams = ['single_node.diag', 'plugin_autoclass.diag',
+                    'not_exist.diag', 'node_attribute.diag']
+        diagpaths = [os.path.join(testdir, 'diagrams', name)
+                     for name in diagrams]
+
+        try:
+            tmpdir = TemporaryDirectory()
+            args = ['-T', 'SVG', '-o', tmpdir.name] + diagpaths
+            app = BlockdiagApp()
+            self.assertEqual(-1, app.run(args))  # not_exist.diag is failed
+
+            outputs = sorted(os.listdir(tmpdir.name))
+            self.assertEqual(['node_attribute.svg', 'plugin_autoclass.svg',
+                              'single_node.svg'], outputs)
+
+            # plugins are unloaded for each diagram
+            from blockdiag import plugins
+            self.assertFalse(plugins.loaded_plugins)
+        finally:
+            tmpdir.clean()
+
+    @with_pil
+    def test_app_shadow_filters(self):
+        from PIL import Image
+
+        testdir = os.path.dirname(__file__)
+        diagpath = os.path.join(testdir, 'diagrams', 'group_attribute.diag')
+
+        try:
+            tmpdir = TemporaryDirectory()
+            images = []
+            for shadow_filter in ('gaussian', 'smooth'):
+                output = os.path.join(tmpdir.name, shadow_filter + '.png')
+                args = ['-T', 'PNG', '-o', output,
+                        '--shadow-filter', shadow_filter, diagpath]
+                self.assertEqual(0, BlockdiagApp().run(args))
+                images.append(Image.open(output))
+
+            self.assertEqual(images[0].size, images[1].size)
         finally:
             tmpdir.clean()
+
+    def test_app_renders_on_server(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from threading import Thread
+
+        from blockdiag.utils import server
+
+        testdir = os.path.dirname(__file__)
+        diagpath = os.path.join(testdir, 'diagrams', 'node_attribute.diag')
+
+        try:
+            tmpdir = TemporaryDirectory()
+            outputs = [os.path.join(tmpdir.name, 'output%d.svg' % i)
+                       for i in range(3)]
+            args = ['-T', 'SVG', diagpath]
+
+            # server is not running: rendered in this process
+            address = os.path.join(tmpdir.name, 'not_exist.sock')
+            self.assertEqual(0, BlockdiagApp().run(['--server', address,
+                                                    '-o', outputs[0]] + args))
+
+            with ProcessPoolExecutor(1) as pool:
+                daemon = server.make_server(BlockdiagApp, 'localhost:0', pool)
+                thread = Thread(target=daemon.serve_forever)
+                thread.start()
+                try:
+                    address = 'localhost:%d' % daemon.server_address[1]
+
+                    # diagram is not parsed in this process
+                    app = BlockdiagApp()
+                    app.parse_diagram = None
+                    self.assertEqual(0, app.run(['--server', address,
+                                                 '-o', outputs[1]] + args))
+
+                    # errors are reported by the server
+                    invalid = os.path.join(tmpdir.name, 'invalid.diag')
+                    with open(invalid, 'w') as fp:
+                        fp.write('blockdiag { A -> ; }')
+
+                    app = BlockdiagApp()
+                    ret = app.run(['--server', address, '-o', outputs[2],
+                                   '-T', 'SVG', invalid])
+                    self.assertEqual(-1, ret)
+                    self.assertFalse(os.path.exists(outputs[2]))
+                finally:
+                    daemon.shutdown()
+                    daemon.server_close()
+                    thread.join()
+
+            # images are linked by the paths resolved on the server
+            with open(outputs[0]) as fp1, open(outputs[1]) as fp2:
+                self.assertEqual(fp1.read(),
+                                 fp2.read().replace(os.getcwd() + '/', ''))
+        finally:
+            tmpdir.clean()
+
+    def test_server_accepts_rendering_options_only(self):
+        from blockdiag.utils import server
+
+        testdir = os.path.dirname(__file__)
+        source = ('blockdiag { A [background = '
+                  '"diagrams/debian-logo-256color-palettealpha.png"]; }')
+
+        # relative paths are resolved from the directory of the request
+        cwd = os.getcwd()
+        status, image, messages = server.render(BlockdiagApp, ['-T', 'SVG'],
+                                                testdir, source)
+        self.assertEqual(0, status)
+        self.assertEqual('', messages)
+        self.assertIn(b'<image ', image)
+        self.assertEqual(cwd, os.getcwd())
+
+        # options to read or write files are rejected
+        for args in (['-o', 'output.svg'], ['--serve', ':0'],
+                     ['--server', ':0'], ['--cache-dir', '/tmp'],
+                     ['-c', 'blockdiagrc'], ['--fontmap', 'fontmap'],
+                     ['-f', 'font.ttf'], ['-T'], ['input.diag']):
+            with self.assertRaises(ValueError):
+                server.render(BlockdiagApp, args, testdir, source)
+
+        with self.assertRaises(ValueError):
+            server.render(BlockdiagApp, [], 'diagrams', source)
+
+    def test_app_requests_rendering_options_only(self):
+        app = BlockdiagApp()
+        args = ['--server', ':0', '-o', 'output.png', '-Tpng', '-a',
+                '--size=320x240', 'input.diag']
+        app.parse_options(args)
+        self.assertEqual(['-T', 'PNG', '-a', '--size', '320x240'],
+                         app.server_args())
+
+        # diagrams using local files are rendered in this process
+        args = ['--server', ':0', '-f', 'font.ttf', 'input.diag']
+        app.parse_options(args)
+        self.assertIsNone(app.server_args())
+
+    def test_server_address(self):
+        from blockdiag.utils import server
+
+        self.assertEqual(('localhost', 8000), server.parse_address('8000'))
+        self.assertEqual(('localhost', 8000), server.parse_address(':8000'))
+        self.assertEqual(('0.0.0.0', 8000),
+                         server.parse_address('0.0.0.0:8000'))
+        self.assertEqual('/tmp/blockdiag.sock',
+                         server.parse_address('/tmp/blockdiag.sock'))
+        self.assertTrue(server.is_loopback('localhost'))
+        self.assertFalse(server.is_loopback('0.0.0.0'))
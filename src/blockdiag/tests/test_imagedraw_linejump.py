@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from blockdiag.imagedraw.base import ImageDraw
+from blockdiag.imagedraw.filters.linejump import LineJumpDrawFilter, XTree
+from blockdiag.utils import XY, Box
+
+
+class RecordingDraw(ImageDraw):
+    def __init__(self):
+        self.calls = []
+
+    def line(self, xy, **kwargs):
+        self.calls.append(('line', tuple(xy)))
+
+    def arc(self, box, start, end, **kwargs):
+        self.calls.append(('arc', box, start, end))
+
+    def rectangle(self, box, **kwargs):
+        self.calls.append(('rectangle', box))
+
+
+class TestLineJumpDrawFilter(unittest.TestCase):
+    lines = [(XY(0, 10), XY(20, 10)),  # horizonal
+             (XY(10, 0), XY(10, 20))]  # vertical
+
+    def draw(self, drawer):
+        drawer.rectangle(Box(0, 0, 5, 5))
+        for line in self.lines:
+            drawer.line(line, jump=True)
+        drawer.rectangle(Box(15, 15, 20, 20))
+
+    def test_deferred(self):
+        target = RecordingDraw()
+        drawer = LineJumpDrawFilter(target, 2)
+        self.draw(drawer)
+        self.assertEqual([], target.calls)
+
+        drawer.save(None, None, None)
+        expected = [('rectangle', Box(0, 0, 5, 5)),
+                    ('line', (XY(0, 10), XY(8, 10))),
+                    ('arc', Box(8, 8, 12, 12), 180, 0),
+                    ('line', (XY(12, 10), XY(20, 10))),
+                    ('line', (XY(10, 0), XY(10, 20))),
+                    ('rectangle', Box(15, 15, 20, 20))]
+        self.assertEqual(expected, target.calls)
+
+    def test_jump_lines(self):
+        deferred = RecordingDraw()
+        drawer = LineJumpDrawFilter(deferred, 2)
+        self.draw(drawer)
+        drawer.save(None, None, None)
+
+        # calls are passed through if jump lines are given up front
+        target = RecordingDraw()
+        drawer = LineJumpDrawFilter(target, 2)
+        drawer.set_options(jump_lines=self.lines)
+
+        drawer.rectangle(Box(0, 0, 5, 5))
+        self.assertEqual([('rectangle', Box(0, 0, 5, 5))], target.calls)
+
+        for line in self.lines:
+            drawer.line(line, jump=True)
+        drawer.rectangle(Box(15, 15, 20, 20))
+        drawer.save(None, None, None)
+        self.assertEqual(deferred.calls, target.calls)
+
+    def test_extra_jump_lines(self):
+        target = RecordingDraw()
+        drawer = LineJumpDrawFilter(target, 2)
+        drawer.set_options(jump_lines=self.lines[:1])
+
+        # a jumping line not given up front is deferred as before
+        drawer.line(self.lines[0], jump=True)
+        drawer.line(self.lines[1], jump=True)
+        drawer.rectangle(Box(15, 15, 20, 20))
+        self.assertEqual([('line', (XY(0, 10), XY(20, 10)))], target.calls)
+
+        drawer.save(None, None, None)
+        expected = [('line', (XY(0, 10), XY(20, 10))),
+                    ('line', (XY(10, 0), XY(10, 20))),
+                    ('rectangle', Box(15, 15, 20, 20))]
+        self.assertEqual(expected, target.calls)
+
+        # jumps over the extra line
+        target = RecordingDraw()
+        drawer = LineJumpDrawFilter(target, 2)
+        drawer.set_options(jump_lines=self.lines[1:])
+
+        drawer.line(self.lines[1], jump=True)
+        drawer.line(self.lines[0], jump=True)
+        drawer.save(None, None, None)
+        expected = [('line', (XY(10, 0), XY(10, 20))),
+                    ('line', (XY(0, 10), XY(8, 10))),
+                    ('arc', Box(8, 8, 12, 12), 180, 0),
+                    ('line', (XY(12, 10), XY(20, 10)))]
+        self.assertEqual(expected, target.calls)
+
+
+class TestXTree(unittest.TestCase):
+    def test_xtree(self):
+        xtree = XTree()
+        xtree.BUCKET_SIZE = 2  # split buckets frequently
+        for x in [5, 1, 9, 3, 7, 5, 2, 8]:
+            xtree.add(x)
+        self.assertEqual([2, 3, 5, 5, 7], list(xtree.between(1, 8)))
+
+        xtree.remove(5)
+        xtree.remove(1)
+        self.assertEqual([2, 3, 5, 7, 8, 9], list(xtree.between(0, 10)))
+        self.assertEqual([], list(xtree.between(3, 5)))
+
+    def test_crosspoints(self):
+        lines = [(XY(0, 5), XY(30, 5)),  # horizonal lines
+                 (XY(0, 15), XY(30, 15)),
+                 (XY(10, 0), XY(10, 20)),  # vertical lines
+                 (XY(20, 10), XY(20, 20)),
+                 (XY(30, 0), XY(30, 20))]  # touches ends of horizonal lines
+        drawer = LineJumpDrawFilter(RecordingDraw(), 2)
+        drawer.set_options(jump_lines=lines)
+        self.assertEqual({5: [10], 15: [10, 20]}, drawer.x_cross)
+        self.assertEqual({10: [5, 15], 20: [15]}, drawer.y_cross)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import unittest
+
+from blockdiag.tests.utils import with_pdf
+from blockdiag.utils import XY, Box, Size
+from blockdiag.utils.fontmap import FontInfo
+
+try:
+    from blockdiag.imagedraw import pdf
+except ImportError:
+    pdf = None
+
+
+def operators(drawer):
+    code = ' '.join(drawer.canvas._code)
+    return [word for word in code.split() if word.isalpha()]
+
+
+@with_pdf
+class TestImageDrawPDF(unittest.TestCase):
+    def setUp(self):
+        self.drawer = pdf.PDFImageDraw(None)
+        self.drawer.set_canvas_size(Size(100, 100))
+
+    def test_graphics_state(self):
+        drawer = self.drawer
+        for i in range(3):
+            drawer.rectangle(Box(10, 10, 20, 20), fill='white',
+                             outline='black')
+            drawer.line([XY(0, 0), XY(50, 50)], fill='black', thick=3)
+
+        ops = operators(drawer)
+        self.assertEqual(1, ops.count('RG'))  # stroke color
+        self.assertEqual(1, ops.count('rg'))  # fill color
+        self.assertEqual(1, ops.count('d'))  # dash
+        self.assertEqual(6, ops.count('w'))  # line width: 1 and 3 in turn
+
+    def test_graphics_state_restored(self):
+        fontpath = os.path.join(os.path.dirname(__file__),
+                                'VLGothic', 'VL-Gothic-Regular.ttf')
+        font = FontInfo('sansserif', fontpath, 11)
+
+        drawer = self.drawer
+        drawer.set_fill_color((0, 0, 255))
+        drawer.textarea(Box(0, 0, 100, 100), 'Hello', font,
+                        fill=(255, 0, 0))
+        drawer.set_fill_color((0, 0, 255))  # restored by Q operator
+        drawer.set_fill_color((255, 0, 0))  # set in q ... Q
+
+        ops = [op for op in operators(drawer) if op in ('q', 'Q', 'rg')]
+        self.assertEqual(['rg', 'q', 'rg', 'Q', 'rg'], ops)
+        self.assertEqual([], drawer.saved_states)
+
+    def test_polyline(self):
+        drawer = self.drawer
+        drawer.line([XY(0, 0), XY(50, 0), XY(50, 50), XY(0, 50)],
+                    fill='black')
+
+        # a polyline is drawn as a path
+        ops = operators(drawer)
+        self.assertEqual(1, ops.count('m'))
+        self.assertEqual(3, ops.count('l'))
+        self.assertEqual(1, ops.count('S'))
+
+    def test_image(self):
+        path = os.path.join(os.path.dirname(__file__), 'diagrams',
+                            'debian-logo-256color-palettealpha.png')
+
+        drawer = self.drawer
+        for i in range(3):
+            drawer.image(Box(0, 0, 50, 50), path)
+        drawer.image(Box(0, 0, 50, 50), 'unknown.png')
+
+        # the image is decoded once, and drawn as a form XObject
+        self.assertEqual({path: ('image0', Size(48, 48)),
+                          'unknown.png': None}, drawer.images)
+        self.assertEqual(3, operators(drawer).count('Do'))
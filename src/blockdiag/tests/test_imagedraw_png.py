@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import unittest
+
+from blockdiag.tests.utils import with_pil
+from blockdiag.utils import Box, Size
+from blockdiag.utils.fontmap import FontInfo
+
+try:
+    from blockdiag.imagedraw import png
+except ImportError:
+    png = None
+
+
+@with_pil
+class TestImageDrawPNG(unittest.TestCase):
+    def test_dash_offsets(self):
+        self.assertEqual([(0, 1), (4, 5), (8, 9)],
+                         list(png.dash_offsets(10, [2, 2])))
+
+        # a dash not fitting to the end is dropped
+        self.assertEqual([(0, 1), (4, 5)], list(png.dash_offsets(9, [2, 2])))
+
+        # odd number of lengths; dash and space in turn
+        self.assertEqual([(0, 2), (4, 5), (9, 9), (12, 14)],
+                         list(png.dash_offsets(16, [3, 1, 2])))
+
+        # style=none
+        self.assertEqual([], list(png.dash_offsets(10, [0, 65535])))
+
+    def test_dashize_line(self):
+        line = ((0, 10), (9, 10))
+        self.assertEqual([[(0, 10), (1, 10)], [(4, 10), (5, 10)]],
+                         list(png.dashize_line(line, [2, 2])))
+
+        line = ((3, 9), (3, 0))
+        self.assertEqual([[(3, 0), (3, 1)], [(3, 4), (3, 5)]],
+                         list(png.dashize_line(line, [2, 2])))
+
+    def test_dashize_diagonal_line(self):
+        line = ((10, 0), (0, 5))
+        expected = [((0, 5), (1, 4)), ((4, 3), (5, 2)), ((8, 1), (9, 0))]
+        self.assertEqual(expected, list(png.dashize_line(line, [2, 2])))
+
+        # same result without numpy
+        numpy, png.numpy = png.numpy, None
+        try:
+            self.assertEqual(expected, list(png.dashize_line(line, [2, 2])))
+        finally:
+            png.numpy = numpy
+
+    def test_text(self):
+        fontpath = os.path.join(os.path.dirname(__file__),
+                                'VLGothic', 'VL-Gothic-Regular.ttf')
+        font = FontInfo('sansserif', fontpath, 11)
+
+        drawer = png.ImageDrawEx(None)
+        drawer.set_canvas_size(Size(100, 100))
+        draw = drawer.draw
+
+        drawer.text((10, 10), 'Hello', font, fill=(255, 0, 0))
+        drawer.textarea(Box(0, 50, 100, 100), 'World', font,
+                        fill=(0, 0, 255), rotate=90)
+
+        # glyphs are drawn via the same Draw object
+        self.assertIs(draw, drawer.draw)
+        colors = set(color for _, color in drawer._image.getcolors())
+        self.assertIn((255, 0, 0), colors)
+        self.assertIn((0, 0, 255), colors)
+
+        # without anti-aliasing
+        top = drawer._image.crop((0, 0, 100, 50))
+        self.assertEqual(set([(255, 255, 255), (255, 0, 0)]),
+                         set(color for _, color in top.getcolors()))
+
+    def test_measurer(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from blockdiag.imagedraw import svg
+        from blockdiag.imagedraw.utils import textmetrics
+
+        fontpath = os.path.join(os.path.dirname(__file__),
+                                'VLGothic', 'VL-Gothic-Regular.ttf')
+        font = FontInfo('sansserif', fontpath, 13)
+        strings = ['measurer %d' % i for i in range(100)]
+
+        def measure(string):
+            return png.measurer.textlinesize(string, font)
+
+        textmetrics.clear()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            sizes = list(executor.map(measure, strings))
+        self.assertEqual(sizes, png.measurer.textlinesizes(strings, font))
+        self.assertEqual(100, textmetrics.misses)
+
+        # PNG and SVG drawers share measured sizes
+        self.assertEqual(sizes[0],
+                         png.ImageDrawEx(None).textlinesize(strings[0], font))
+        self.assertEqual(sizes, svg.SVGImageDraw(None).textlinesizes(strings,
+                                                                     font))
+        self.assertEqual(100, textmetrics.misses)
+
+    def test_shadow_masks(self):
+        for shadow_filter in (None, 'gaussian'):
+            drawer = png.ImageDrawEx(None, shadow_filter=shadow_filter)
+            drawer.set_canvas_size(Size(200, 100))
+            for x in (10, 60, 110):
+                drawer.rectangle(Box(x, 10, x + 40, 40), fill=(0, 0, 0),
+                                 filter='blur')
+
+            # identical shadows share a blurred image
+            self.assertEqual(1, len(drawer.shadow_masks))
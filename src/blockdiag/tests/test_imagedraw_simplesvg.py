@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import os
+import unittest
+
+from blockdiag.imagedraw.simplesvg import g, rect, svg, svgclass, text
+from blockdiag.imagedraw.svg import SVGImageDraw
+from blockdiag.tests.utils import TemporaryDirectory
+
+
+class TestSimpleSVG(unittest.TestCase):
+    def create_document(self):
+        doc = svg(0, 0, 100, 50, nodoctype=True)
+        group = g(transform='rotate(90)')
+        group.addElement(rect(0, 0, 10, 20, fill='red', stroke_width=1,
+                              stroke_dasharray=None))
+        group.addElement(text(5, 5, 'A & B', font_family='serif'))
+        doc.addElement(group)
+
+        return doc
+
+    def test_to_xml(self):
+        expected = ('<svg viewBox="0 0 100 50" '
+                    'xmlns="http://www.w3.org/2000/svg">\n'
+                    '  <g transform="rotate(90)">\n'
+                    '    <rect fill="red" height="20" stroke-width="1" '
+                    'width="10" x="0" y="0" />\n'
+                    '    <text font-family="serif" x="5" y="5">'
+                    'A &amp; B</text>\n'
+                    '  </g>\n'
+                    '</svg>\n')
+        self.assertEqual(expected, self.create_document().to_xml())
+
+    def test_to_xml_stream(self):
+        doc = self.create_document()
+        expected = doc.to_xml()
+
+        stream = io.StringIO()
+        self.assertIsNone(doc.to_xml(stream))
+        self.assertEqual(expected, stream.getvalue())
+
+        stream = io.BytesIO()
+        doc.to_xml(stream)
+        self.assertEqual(expected.encode('utf-8'), stream.getvalue())
+
+    def test_slots(self):
+        feGaussianBlur = svgclass('feGaussianBlur')
+        for elem in (svg(0, 0, 1, 1), rect(0, 0, 1, 1), feGaussianBlur()):
+            self.assertFalse(hasattr(elem, '__dict__'))
+
+    def test_save(self):
+        drawer = SVGImageDraw(None, nodoctype=True)
+        drawer.set_canvas_size((100, 50))
+        expected = drawer.save(None, None, 'SVG')
+        self.assertIn('<svg ', expected)
+
+        # the document is returned when written to a file
+        try:
+            tmpdir = TemporaryDirectory()
+            path = os.path.join(tmpdir.name, 'output.svg')
+            self.assertEqual(expected, drawer.save(path, None, 'SVG'))
+            with open(path) as fp:
+                self.assertEqual(expected, fp.read())
+        finally:
+            tmpdir.clean()
+
+        # ... and streamed into file-like objects
+        stream = io.StringIO()
+        self.assertIsNone(drawer.save(stream, None, 'SVG'))
+        self.assertEqual(expected, stream.getvalue())
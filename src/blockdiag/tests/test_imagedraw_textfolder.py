@@ -23,7 +23,11 @@ CHAR_HEIGHT = 10
 
 
 class Metrics(object):
+    def __init__(self):
+        self.measured = 0
+
     def textsize(self, text):
+        self.measured += 1
         length = len(text)
         return Size(CHAR_WIDTH * length, CHAR_HEIGHT)
 
@@ -89,6 +93,21 @@ class TestTextFolder(unittest.TestCase):
         ret = splittext(metrics, text, CHAR_WIDTH * 3)
         self.assertEqual([' '], ret)
 
+        # too narrow to draw any characters
+        text = "abc"
+        ret = splittext(metrics, text, CHAR_WIDTH - 1)
+        self.assertEqual([], ret)
+
+    def test_splittext_long_text(self):
+        metrics = Metrics()
+
+        text = "abcdefghij" * 30
+        ret = splittext(metrics, text, CHAR_WIDTH * 7)
+        self.assertEqual([text[i:i + 7] for i in range(0, 300, 7)], ret)
+
+        # binary search takes O(log n) measurements for each line
+        self.assertLess(metrics.measured, 43 * 10)
+
     def test_truncate_text(self):
         metrics = Metrics()
 
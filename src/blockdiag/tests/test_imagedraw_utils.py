@@ -15,8 +15,9 @@
 
 import unittest
 
-from blockdiag.imagedraw.utils import (hankaku_len, is_zenkaku, string_width,
-                                       textsize, zenkaku_len)
+from blockdiag.imagedraw.utils import (TextMetricsCache, hankaku_len,
+                                       is_zenkaku, string_width, textsize,
+                                       zenkaku_len)
 
 
 class TestUtils(unittest.TestCase):
@@ -68,3 +69,25 @@ class TestUtils(unittest.TestCase):
         # あいう
         font = FontInfo('serif', None, 18)
         self.assertEqual((54, 18), textsize("\u3042\u3044\u3046", font))
+
+    def test_textmetrics_cache(self):
+        cache = TextMetricsCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)  # 'b' is least recently used
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(3, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+        cache.resize(1)
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.hits)
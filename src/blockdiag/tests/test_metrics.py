@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import copy
+
+from blockdiag.metrics import DiagramMetrics
+from blockdiag.tests.utils import BuilderTestCase
+from blockdiag.utils import Box
+
+
+class TestMetrics(BuilderTestCase):
+    def test_spreadsheet_sizes(self):
+        diagram = self.build('node_width_and_height.diag')
+        metrics = DiagramMetrics(diagram)
+        sheet = metrics.spreadsheet
+
+        # A (0, 0): height = 80, B (1, 0), C (1, 1): width = 256
+        self.assertEqual({0: 128, 1: 256}, dict(sheet.node_width))
+        self.assertEqual({0: 80, 1: 40}, dict(sheet.node_height))
+
+    def test_spreadsheet_offsets(self):
+        diagram = self.build('node_width_and_height.diag')
+        metrics = DiagramMetrics(diagram)
+        sheet = metrics.spreadsheet
+
+        def expected_box(node):
+            x, y = node.xy
+            x1 = (sum(sheet.node_width[i] for i in range(x)) +
+                  sum(sheet.span_width[i] for i in range(x + 1)))
+            y1 = (sum(sheet.node_height[i] for i in range(y)) +
+                  sum(sheet.span_height[i] for i in range(y + 1)))
+            x2 = x1 + sheet.node_width[x]
+            y2 = y1 + sheet.node_height[y]
+            return Box(x1, y1, x2, y2)
+
+        for node in diagram.nodes:
+            self.assertEqual(expected_box(node), metrics.cell(node, False).box)
+
+        # offsets are updated by set_*() and add_*() methods
+        sheet.set_node_width(0, 300)
+        sheet.add_span_width(1, 20)
+        sheet.set_node_height(0, 100)
+        sheet.add_span_height(0, 10)
+        for node in diagram.nodes:
+            self.assertEqual(expected_box(node), metrics.cell(node, False).box)
+
+        width = sum(sheet.node_width[i] + sheet.span_width[i]
+                    for i in range(diagram.colwidth + 1))
+        width -= sheet.node_width[diagram.colwidth]
+        height = sum(sheet.node_height[i] + sheet.span_height[i]
+                     for i in range(diagram.colheight + 1))
+        height -= sheet.node_height[diagram.colheight]
+        self.assertEqual((width, height),
+                         metrics.pagesize(diagram.colwidth,
+                                          diagram.colheight))
+
+    def test_copied_metrics(self):
+        diagram = self.build('node_width_and_height.diag')
+        metrics = DiagramMetrics(diagram)
+        node = diagram.nodes[1]
+        box = metrics.cell(node, False).box
+        pagesize = metrics.pagesize(diagram.colwidth, diagram.colheight)
+
+        # changes of the copy do not affect the original, and vice versa
+        copied = copy.copy(metrics)
+        copied.spreadsheet.set_node_width(0, 300)
+        copied.spreadsheet.add_span_height(0, 10)
+        self.assertNotEqual(box, copied.cell(node, False).box)
+        self.assertEqual(box, metrics.cell(node, False).box)
+        self.assertEqual(pagesize, metrics.pagesize(diagram.colwidth,
+                                                    diagram.colheight))
+        self.assertIsNot(copied.cell(node), metrics.cell(node))
+
+        metrics.spreadsheet.add_span_width(1, 20)
+        self.assertEqual(copied.cell(node, False).box,
+                         copy.copy(copied).cell(node, False).box)
+
+        # shifted metrics have their own cache and spreadsheet too
+        shifted = metrics.shift(10, 20)
+        self.assertEqual(metrics.cell(node, False).box.shift(10, 20),
+                         shifted.cell(node, False).box)
+        self.assertIs(shifted, shifted.spreadsheet.metrics)
+
+    def test_memoized_metrics(self):
+        diagram = self.build('edge_label.diag')
+        metrics = DiagramMetrics(diagram)
+
+        node = diagram.nodes[0]
+        self.assertIs(metrics.cell(node), metrics.cell(node))
+        self.assertIs(metrics.node(node), metrics.node(node))
+
+        edge = diagram.edges[0]
+        self.assertIs(metrics.edge(edge), metrics.edge(edge))
+
+        # geometry of edges is computed once, and can not be modified
+        shaft = metrics.edge(edge).shaft
+        self.assertIs(shaft, metrics.edge(edge).shaft)
+        self.assertIsInstance(shaft.polylines, tuple)
+        self.assertIsInstance(shaft.polylines[0], tuple)
+        self.assertIsInstance(metrics.edge(edge).heads[0], tuple)
+        self.assertIs(metrics.edge(edge).labelbox,
+                      metrics.edge(edge).labelbox)
+
+        # shifted metrics do not share the cache
+        shifted = metrics.shift(10, 10)
+        self.assertEqual(metrics.cell(node).topleft.shift(10, 10),
+                         shifted.cell(node).topleft)
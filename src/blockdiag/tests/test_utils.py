@@ -13,9 +13,16 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import io
+import os
+import subprocess
+import sys
 import unittest
 
-from blockdiag.utils import Size, unquote
+from blockdiag.tests.utils import TemporaryDirectory
+from blockdiag.utils import Size, entrypoints, unquote
+from blockdiag.utils.fontcache import FontCache
+from blockdiag.utils.rendercache import RenderCache, image_fingerprints
 
 
 class TestUtils(unittest.TestCase):
@@ -53,3 +60,126 @@ class TestUtils(unittest.TestCase):
         self.assertEqual('test', unquote("'test'"))
         self.assertEqual("'half quoted", unquote("'half quoted"))
         self.assertEqual('"half quoted', unquote('"half quoted'))
+
+    def test_entrypoints(self):
+        entries = entrypoints.get('blockdiag_noderenderer')
+        self.assertEqual('blockdiag.noderenderer.box', entries['box'].value)
+        self.assertIs(entries, entrypoints.get('blockdiag_noderenderer'))
+
+        self.assertEqual({}, entrypoints.get('blockdiag_unknown_group'))
+
+    def test_noderenderer_loads_used_shapes_only(self):
+        script = ("import sys\n"
+                  "from blockdiag import noderenderer\n"
+                  "noderenderer.get('box')\n"
+                  "noderenderer.get('flowchart.input')\n"
+                  "print(' '.join(sorted(sys.modules)))\n")
+        output = subprocess.check_output([sys.executable, '-c', script])
+        modules = output.decode('utf-8').split()
+
+        self.assertIn('blockdiag.noderenderer.box', modules)
+        self.assertIn('blockdiag.noderenderer.flowchart.input', modules)
+        self.assertNotIn('blockdiag.noderenderer.cloud', modules)
+        self.assertNotIn('pkg_resources', modules)
+
+    def test_rendercache(self):
+        try:
+            tmpdir = TemporaryDirectory()
+            cache = RenderCache(os.path.join(tmpdir.name, 'cache'), 25)
+
+            key1 = cache.key('A -> B', 'svg', dict(antialias=False))
+            key2 = cache.key('A -> B', 'png', dict(antialias=False))
+            key3 = cache.key('A -> B', 'svg', dict(antialias=True))
+            self.assertEqual(key1, cache.key('A -> B', 'SVG',
+                                             dict(antialias=False)))
+            self.assertEqual(3, len(set([key1, key2, key3])))
+
+            self.assertIsNone(cache.get(key1))
+            cache.set(key1, '0123456789')
+            cache.set(key2, b'0123456789')
+            self.assertEqual(b'0123456789', cache.get(key1))
+
+            # least recently used image (key2) is evicted
+            os.utime(os.path.join(cache.path, key2), (0, 0))
+            cache.set(key3, b'0123456789')
+            self.assertEqual(b'0123456789', cache.get(key1))
+            self.assertIsNone(cache.get(key2))
+            self.assertEqual(b'0123456789', cache.get(key3))
+
+            # images are made by render() if not cached
+            self.assertEqual(b'0123456789', cache.fetch(key1, None))
+            self.assertEqual(b'9876543210',
+                             cache.fetch(key2, lambda: '9876543210'))
+            self.assertEqual(b'9876543210', cache.get(key2))
+        finally:
+            tmpdir.clean()
+
+    def test_rendercache_key_with_images(self):
+        try:
+            tmpdir = TemporaryDirectory()
+            cache = RenderCache(os.path.join(tmpdir.name, 'cache'))
+            with open(os.path.join(tmpdir.name, 'icon.png'), 'wb') as fp:
+                fp.write(b'0123456789')
+
+            source = 'A [icon = "icon.png"]'
+            key1 = cache.key(source, 'svg', basedir=tmpdir.name)
+
+            # key is changed when the image is modified
+            with open(os.path.join(tmpdir.name, 'icon.png'), 'wb') as fp:
+                fp.write(b'01234567890123456789')
+            key2 = cache.key(source, 'svg', basedir=tmpdir.name)
+            self.assertNotEqual(key1, key2)
+            self.assertEqual(key2, cache.key(source, 'svg',
+                                             basedir=tmpdir.name))
+
+            # URLs are not looked up
+            source = 'A [background = "http://example.com/image.png"]'
+            self.assertEqual([], image_fingerprints(source))
+        finally:
+            tmpdir.clean()
+
+    def test_fontcache(self):
+        def touch(*path):
+            io.open(os.path.join(tmpdir.name, *path), 'w').close()
+
+        try:
+            tmpdir = TemporaryDirectory()
+            os.makedirs(os.path.join(tmpdir.name, 'fonts', 'b'))
+            touch('fonts', 'b', 'font2.ttf')
+
+            fontdirs = [os.path.join(tmpdir.name, 'font*')]
+            fontfiles = ['font1.ttf', 'font2.ttf']
+            cache = FontCache(os.path.join(tmpdir.name, 'cache.json'))
+            found = os.path.join(tmpdir.name, 'fonts', 'b', 'font2.ttf')
+            self.assertEqual(found, cache.find(fontdirs, fontfiles))
+
+            # cached result is used while directories are not changed
+            fontdir = os.path.join(tmpdir.name, 'fonts', 'b')
+            stat = os.stat(fontdir)
+            touch('fonts', 'b', 'font1.ttf')
+            os.utime(fontdir, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            self.assertEqual(found, cache.find(fontdirs, fontfiles))
+
+            # changes of directories invalidate the cache
+            os.utime(fontdir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            found = os.path.join(tmpdir.name, 'fonts', 'b', 'font1.ttf')
+            self.assertEqual(found, cache.find(fontdirs, fontfiles))
+
+            os.makedirs(os.path.join(tmpdir.name, 'fonts2'))
+            self.assertIsNone(cache.find(fontdirs, ['font3.ttf']))
+            touch('fonts2', 'font3.ttf')
+            found = os.path.join(tmpdir.name, 'fonts2', 'font3.ttf')
+            self.assertEqual(found, cache.find(fontdirs, ['font3.ttf']))
+        finally:
+            tmpdir.clean()
+
+    def test_fontcache_path(self):
+        from unittest.mock import patch
+
+        with patch.dict(os.environ, XDG_CACHE_HOME='/path/to/cache'):
+            self.assertEqual('/path/to/cache/blockdiag/fonts.json',
+                             FontCache().path)
+
+        # tests do not write to the user cache directory
+        home = os.path.expanduser('~')
+        self.assertFalse(FontCache().path.startswith(home))
@@ -14,22 +14,29 @@
 #  limitations under the License.
 
 import codecs
+import glob
 import os
 import re
 import sys
 import traceback
-from optparse import SUPPRESS_HELP, OptionParser
+from importlib import import_module
+from optparse import SUPPRESS_HELP, OptionParser, Values
 
 from blockdiag import imagedraw, plugins
-from blockdiag.utils import images
+from blockdiag.utils import images, server
 from blockdiag.utils.config import ConfigParser
+from blockdiag.utils.fontcache import FontCache
 from blockdiag.utils.fontmap import FontMap, parse_fontpath
 from blockdiag.utils.logging import error, warning
+from blockdiag.utils.rendercache import RenderCache
 
 
 class Application(object):
     module = None
     options = None
+    code = None
+    cache = None
+    basedir = None  # directory to resolve relative paths in the diagram
 
     def __init__(self):
         self.cleanup_handlers = []
@@ -47,11 +54,24 @@ class Application(object):
     def run(self, args):
         try:
             self.parse_options(args)
+            self.options.basedir = self.basedir
+            if self.options.serve:
+                return self.serve()
+            elif self.options.server:
+                if self.code is None:
+                    ret = self.request_server()
+                    if ret is not None:
+                        return ret
+
+                check_image_format(self.options)
+
+            self.import_modules()
             self.create_fontmap()
-            self.setup()
+            if len(self.options.inputs) > 1:
+                return self.run_batch()
 
-            parsed = self.parse_diagram()
-            return self.build_diagram(parsed)
+            self.setup()
+            return self.render()
         except SystemExit as e:
             return e
         except UnicodeEncodeError:
@@ -66,6 +86,117 @@ class Application(object):
         finally:
             self.cleanup()
 
+    def import_modules(self):
+        """Import parser, builder and drawer of the diagram module.
+           They are not needed to request the server to render.
+        """
+        for name in ('parser', 'builder', 'drawer'):
+            import_module('%s.%s' % (self.module.__name__, name))
+
+    def run_batch(self):
+        """Render all input files in this process.
+           Fonts, renderers and drawers are initialized only once;
+           the state of plugins and images is reset for each diagram.
+        """
+        failed = False
+        for _input, output in zip(self.options.inputs, self.options.outputs):
+            self.options.input = _input
+            self.options.output = output
+            self.code = None
+            try:
+                self.setup()
+                if self.render() != 0:
+                    failed = True
+            except UnicodeEncodeError:
+                error("%s: UnicodeEncodeError caught "
+                      "(check your font settings)" % _input)
+                failed = True
+            except Exception as e:
+                if self.options.debug:
+                    traceback.print_exc()
+                else:
+                    error("%s: %s" % (_input, e))
+                failed = True
+            finally:
+                self.cleanup()
+
+        if failed:
+            return -1
+        else:
+            return 0
+
+    def serve(self):
+        server.serve(self.__class__, self.options.serve, self.options.workers)
+        return 0
+
+    def request_server(self):
+        """Render the diagram on the server.
+           Returns None if the server is not available.
+        """
+        if len(self.options.inputs) > 1:
+            return None
+        elif getattr(self.options, 'separate', False):
+            return None  # images are written to several files
+
+        request_args = self.server_args()
+        if request_args is None:
+            return None
+
+        response = server.request(self.options.server, request_args,
+                                  os.getcwd(), self.read_diagram())
+        if response is None:
+            return None
+
+        status, image, messages = response
+        sys.stderr.write(messages)
+        if status == 0:
+            if self.options.output == '-':
+                sys.stdout.buffer.write(image)
+            else:
+                with open(self.options.output, 'wb') as fp:
+                    fp.write(image)
+
+        return status
+
+    def server_args(self):
+        """Convert args to the options accepted by the server
+           (``server.RENDER_OPTIONS``).
+           Returns None if the other options are given.
+        """
+        accepted = ('antialias', 'debug', 'nodoctype', 'output', 'server',
+                    'shadow_filter', 'size', 'transparency', 'type')
+        if not set(self.options.given_options) <= set(accepted):
+            return None
+
+        request_args = ['-T', self.options.type]
+        if self.options.antialias:
+            request_args.append('-a')
+        if self.options.nodoctype:
+            request_args.append('--nodoctype')
+        if self.options.transparency is False:
+            request_args.append('--no-transparency')
+        if self.options.shadow_filter:
+            request_args.extend(['--shadow-filter',
+                                 self.options.shadow_filter])
+        if self.options.size:
+            request_args.extend(['--size', '%dx%d' % tuple(self.options.size)])
+
+        return request_args
+
+    def render(self):
+        if self.code is None:
+            self.read_diagram()
+
+        if self.fetch_cached_image():
+            return 0
+
+        parsed = self.parse_diagram()
+        ret = self.build_diagram(parsed)
+        if ret == 0:
+            self.store_cached_image()
+
+        return ret
+
     def parse_options(self, args):
         self.options = Options(self.module).parse(args)
 
@@ -76,17 +207,67 @@ class Application(object):
         images.setup(self)
         plugins.setup(self)
 
-    def parse_diagram(self):
+    def read_diagram(self):
         if self.options.input == '-':
             self.code = sys.stdin.read()
             if self.code.startswith('\ufeff'):  # strip BOM
                 self.code = self.code[1:]
         else:
-            fp = codecs.open(self.options.input, 'r', 'utf-8-sig')
-            self.code = fp.read()
+            with codecs.open(self.options.input, 'r', 'utf-8-sig') as fp:
+                self.code = fp.read()
+
+        return self.code
+
+    def parse_diagram(self):
+        if self.code is None:
+            self.read_diagram()
 
         return self.module.parser.parse_string(self.code)
 
+    def create_render_cache(self):
+        if not self.options.cache_dir:
+            return None
+        elif getattr(self.options, 'separate', False):
+            return None  # images are written to several files
+        elif self.options.output == '-':
+            return None
+
+        maxsize = self.options.cache_size * 1024 * 1024
+        return RenderCache(self.options.cache_dir, maxsize)
+
+    def render_cache_key(self):
+        options = dict(antialias=self.options.antialias,
+                       nodoctype=self.options.nodoctype,
+                       transparency=self.options.transparency,
+                       shadow_filter=self.options.shadow_filter,
+                       size=self.options.size)
+        return self.cache.key(self.code, self.options.type, options,
+                              self.fontmap, self.module, self.options.basedir)
+
+    def fetch_cached_image(self):
+        self.cache = self.create_render_cache()
+        if self.cache is None:
+            return False
+
+        image = self.cache.get(self.render_cache_key())
+        if image is None:
+            return False
+
+        with open(self.options.output, 'wb') as fp:
+            fp.write(image)
+
+        return True
+
+    def store_cached_image(self):
+        if self.cache is None:
+            return
+
+        try:
+            with open(self.options.output, 'rb') as fp:
+                self.cache.set(self.render_cache_key(), fp.read())
+        except (IOError, OSError) as exc:
+            warning("could not store the image to cache: %s" % exc)
+
     def build_diagram(self, tree):
         ScreenNodeBuilder = self.module.builder.ScreenNodeBuilder
         try:
@@ -99,7 +280,8 @@ class Application(object):
                              self.options.output, fontmap=self.fontmap,
                              code=self.code, antialias=self.options.antialias,
                              nodoctype=self.options.nodoctype,
-                             transparency=self.options.transparency)
+                             transparency=self.options.transparency,
+                             shadow_filter=self.options.shadow_filter)
         drawer.draw()
 
         if self.options.size:
@@ -126,6 +308,10 @@ class Options(object):
 
     def parse(self, args):
         self.options, self.args = self.parser.parse_args(args)
+
+        # names of options given in args (not defaults nor configs)
+        given, _ = self.parser.parse_args(args, Values())
+        self.options.given_options = sorted(vars(given))
         self.validate()
         self.read_configfile()
 
@@ -133,16 +319,24 @@ class Options(object):
 
     def build_parser(self):
         version = "%%prog %s" % self.module.__version__
-        usage = "usage: %prog [options] infile"
+        usage = "usage: %prog [options] infile [infile ...]"
         self.parser = p = OptionParser(usage=usage, version=version)
         p.add_option('-a', '--antialias', action='store_true',
                      help='Pass diagram image to anti-alias filter')
         p.add_option('-c', '--config',
                      help='read configurations from FILE', metavar='FILE')
+        p.add_option('--cache-dir', dest='cache_dir', metavar='DIR',
+                     help='reuse images rendered previously from the same '
+                          'diagram (cached in DIR)')
+        p.add_option('--cache-size', dest='cache_size', type='int',
+                     default=100, metavar='MB',
+                     help='limit the size of the cache directory '
+                          '(default: 100MB)')
         p.add_option('--debug', action='store_true',
                      help='Enable debug mode')
         p.add_option('-o', dest='output',
-                     help='write diagram to FILE', metavar='FILE')
+                     help='write diagram to FILE (or into DIR if multiple '
+                          'files are given)', metavar='FILE')
         p.add_option('-f', '--font', default=[], action='append',
                      help='use FONT to draw diagram', metavar='FONT')
         p.add_option('--fontmap',
@@ -153,36 +347,75 @@ class Options(object):
                      default=True, action='store_false',
                      help='do not make transparent background of diagram ' +
                           '(PNG only)')
+        p.add_option('--shadow-filter', dest='shadow_filter',
+                     type='choice', choices=['gaussian', 'smooth'],
+                     help='Blur shadows with smooth (default) or '
+                          'gaussian filter (PNG only; gaussian is faster '
+                          'and looks slightly different)')
+        p.add_option('--serve', metavar='ADDRESS',
+                     help='run as a server rendering diagrams requested '
+                          'at ADDRESS (path of Unix domain socket, or '
+                          '[HOST:]PORT; HOST is localhost by default)')
+        p.add_option('--server', metavar='ADDRESS',
+                     help='render diagrams on the server at ADDRESS '
+                          '(render in this process if it is not running)')
         p.add_option('--size',
                      help='Size of diagram (ex. 320x240)')
         p.add_option('-T', dest='type', default='PNG',
                      help='Output diagram as TYPE format')
         p.add_option('--nodoctype', action='store_true',
                      help='Do not output doctype definition tags (SVG only)')
+        p.add_option('--workers', type='int', metavar='NUM',
+                     help='number of worker processes of the server '
+                          '(default: number of CPUs)')
 
         return p
 
     def validate(self):
+        if self.options.serve:
+            if self.args:
+                msg = "--serve option does not take input files."
+                raise RuntimeError(msg)
+
+            self.options.inputs = []
+            return
+
         if len(self.args) == 0:
             self.parser.print_help()
             sys.exit(0)
 
-        self.options.input = self.args.pop(0)
-        if self.options.output:
-            pass
-        elif self.options.output == '-':
-            self.options.output = 'output.' + self.options.type.lower()
+        self.options.inputs = self.expand_inputs(self.args)
+        if len(self.options.inputs) == 0:
+            msg = "no input files found: %s" % ' '.join(self.args)
+            raise RuntimeError(msg)
+        elif len(self.options.inputs) == 1:
+            self.options.input = self.options.inputs[0]
+            if self.options.output:
+                pass
+            elif self.options.output == '-':
+                self.options.output = 'output.' + self.options.type.lower()
+            else:
+                self.options.output = self.output_filename(self.options.input)
+
+            self.options.outputs = [self.options.output]
         else:
-            basename = os.path.splitext(self.options.input)[0]
-            ext = '.%s' % self.options.type.lower()
-            self.options.output = basename + ext
+            if '-' in self.options.inputs:
+                msg = "stdin (-) can not be mixed with other input files."
+                raise RuntimeError(msg)
+            elif self.options.output and \
+                    not os.path.isdir(self.options.output):
+                msg = ("-o option must be a directory "
+                       "if multiple input files are given.")
+                raise RuntimeError(msg)
+
+            self.options.input = None
+            self.options.outputs = [self.output_filename(path)
+                                    for path in self.options.inputs]
+            self.options.output = None
 
         self.options.type = self.options.type.upper()
-        try:
-            imagedraw.create(self.options.type, None, debug=self.options.debug)
-        except Exception:
-            msg = "unknown format: %s" % self.options.type
-            raise RuntimeError(msg)
+        if not self.options.server:  # checked by the server if available
+            check_image_format(self.options)
 
         if self.options.size:
             matched = re.match(r'^(\d+)x(\d+)$', self.options.size)
@@ -220,6 +453,34 @@ class Options(object):
             msg = "fontmap file is not found: %s" % self.options.fontmap
             raise RuntimeError(msg)
 
+    def expand_inputs(self, args):
+        """Expand input arguments to the list of input files.
+           Wildcards are expanded, and ``@FILE`` reads the input files
+           from FILE (one path per line; lines starting with # are ignored).
+        """
+        inputs = []
+        for arg in args:
+            if arg.startswith('@'):
+                with codecs.open(arg[1:], 'r', 'utf-8-sig') as fp:
+                    lines = (line.strip() for line in fp)
+                    paths = [path for path in lines
+                             if path and not path.startswith('#')]
+                inputs.extend(self.expand_inputs(paths))
+            elif re.search(r'[*?[]', arg):
+                inputs.extend(sorted(glob.glob(arg)))
+            else:
+                inputs.append(arg)
+
+        return inputs
+
+    def output_filename(self, path):
+        basename = os.path.splitext(path)[0]
+        if self.options.output:  # output directory for multiple inputs
+            basename = os.path.join(self.options.output,
+                                    os.path.basename(basename))
+
+        return basename + '.%s' % self.options.type.lower()
+
     def read_configfile(self):
         if self.options.config:
             configpath = self.options.config
@@ -252,8 +513,15 @@ class Options(object):
                 self.options.fontmap = configpath
 
 
+def check_image_format(options):
+    try:
+        imagedraw.create(options.type, None, debug=options.debug)
+    except Exception:
+        msg = "unknown format: %s" % options.type
+        raise RuntimeError(msg)
+
+
 def detectfont(options):
-    import glob
     fontdirs = [
         '/usr/share/fonts',
         '/Library/Fonts',
@@ -284,13 +552,7 @@ def detectfont(options):
             raise RuntimeError(msg)
 
     if fontpath is None:
-        globber = (glob.glob(d) for d in fontdirs)
-        for fontdir in sum(globber, []):
-            for root, _, files in os.walk(fontdir):
-                for font in fontfiles:
-                    if font in files:
-                        fontpath = os.path.join(root, font)
-                        break
+        fontpath = FontCache().find(fontdirs, fontfiles)
 
     return fontpath
 
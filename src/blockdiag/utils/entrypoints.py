@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+index = {}
+index_lock = threading.Lock()
+
+
+def scan(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # python 3.7
+        from importlib_metadata import entry_points
+
+    try:
+        found = entry_points(group=group)
+    except TypeError:  # python 3.8 and 3.9
+        found = entry_points().get(group, [])
+
+    entries = {}
+    for entry in found:
+        entries.setdefault(entry.name, entry)  # first one wins
+
+    return entries
+
+
+def get(group):
+    """Return the entry points of group as a dict keyed by name.
+
+    Installed distributions are scanned only once for each group;
+    the entry points are not loaded here.
+    """
+    if group not in index:
+        with index_lock:
+            if group not in index:
+                index[group] = scan(group)
+
+    return index[group]
+
+
+def clear():
+    with index_lock:
+        index.clear()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import glob
+import json
+import os
+from tempfile import mkstemp
+
+
+def default_cachepath():
+    if os.environ.get('XDG_CACHE_HOME'):
+        cachedir = os.environ.get('XDG_CACHE_HOME')
+    elif os.environ.get('LOCALAPPDATA'):
+        cachedir = os.environ.get('LOCALAPPDATA')
+    elif os.environ.get('HOME'):
+        cachedir = os.path.join(os.environ.get('HOME'), '.cache')
+    else:
+        return None
+
+    return os.path.join(cachedir, 'blockdiag', 'fonts.json')
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class FontCache(object):
+    """Cache of font files found in font directories.
+
+    A result is stored with the mtimes of all directories walked to find
+    it, and is discarded when any of them has changed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_cachepath()
+
+    def load(self):
+        try:
+            with open(self.path) as fp:
+                entries = json.load(fp)
+            if isinstance(entries, dict):
+                return entries
+        except (TypeError, ValueError, IOError, OSError):
+            pass
+
+        return {}
+
+    def save(self, entries):
+        if self.path is None:
+            return
+
+        try:
+            dirname = os.path.dirname(self.path)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+
+            fd, tmpfile = mkstemp(prefix='.', dir=dirname)
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(entries, fp)
+            os.replace(tmpfile, self.path)
+        except (IOError, OSError):
+            pass  # the cache is optional
+
+    def is_fresh(self, entry):
+        return all(mtime(path) == value
+                   for path, value in entry.get('dirs', {}).items())
+
+    def find(self, fontdirs, fontfiles):
+        """Find one of fontfiles under fontdirs (glob patterns).
+
+        As the directories are walked in order, the font found last wins;
+        in the same directory, former fontfiles are preferred.
+        """
+        fontdirs = sum((glob.glob(d) for d in fontdirs), [])
+        key = json.dumps([fontdirs, fontfiles])
+
+        entries = self.load()
+        entry = entries.get(key)
+        if isinstance(entry, dict) and self.is_fresh(entry):
+            return entry.get('fontpath')
+
+        fontpath = None
+        dirs = {}
+        for fontdir in fontdirs:
+            for root, _, files in os.walk(fontdir):
+                dirs[root] = mtime(root)
+                for font in fontfiles:
+                    if font in files:
+                        fontpath = os.path.join(root, font)
+                        break
+
+        entries[key] = dict(fontpath=fontpath, dirs=dirs)
+        self.save(entries)
+        return fontpath
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import re
+from hashlib import sha1
+from tempfile import mkstemp
+
+import blockdiag
+from blockdiag.utils import unquote, urlutil
+from blockdiag.utils.fontmap import parse_fontpath
+
+DEFAULT_MAXSIZE = 100 * 1024 * 1024  # bytes
+IMAGE_ATTRIBUTE = re.compile(r'\b(?:background|icon)\s*=\s*'
+                             r'("(?:\\.|[^"])*"|\'(?:\\.|[^\'])*\'|[^\s,;\]]+)')
+
+
+def file_fingerprint(path):
+    """Identify the version of a file by its path, mtime and size"""
+    try:
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+    except (TypeError, OSError):
+        return (path, None, None)
+
+
+def image_fingerprints(source, basedir=None):
+    """Identify the versions of local images referred from the diagram
+       source (``background`` and ``icon`` attributes)
+    """
+    images = []
+    for matched in IMAGE_ATTRIBUTE.finditer(source):
+        path = unquote(matched.group(1))
+        if not urlutil.isurl(path):
+            images.append(file_fingerprint(os.path.join(basedir or '', path)))
+
+    return images
+
+
+def fontmap_fingerprint(fontmap):
+    if fontmap is None:
+        return None
+
+    fonts = []
+    for name, font in sorted(fontmap.fonts.items()):
+        path, index = parse_fontpath(font.path)
+        fonts.append((name, index) + file_fingerprint(path))
+
+    return (fonts, sorted(fontmap.aliases.items()),
+            fontmap.fontsize, fontmap.default_fontfamily)
+
+
+class RenderCache(object):
+    """Content addressed cache of rendered diagram images.
+
+    Images are stored as files under ``path``.  When the total size exceeds
+    ``maxsize`` bytes, least recently used images are removed.
+    """
+
+    def __init__(self, path, maxsize=DEFAULT_MAXSIZE):
+        self.path = path
+        self.maxsize = maxsize
+
+    def key(self, source, _format, options=None, fontmap=None, module=None,
+            basedir=None):
+        """Make a cache key from the diagram source and render conditions
+
+        ``options`` is a dict of options affecting the image (antialias,
+        size and so on).  ``module`` is the diagram module (e.g. blockdiag).
+        Local images in the diagram are looked up from ``basedir`` (the
+        current directory by default).  The key is made without parsing
+        the diagram.
+        """
+        module = module or blockdiag
+        seed = [module.__name__, module.__version__, blockdiag.__version__,
+                source, _format.upper(), sorted((options or {}).items()),
+                fontmap_fingerprint(fontmap),
+                image_fingerprints(source, basedir)]
+        return sha1(repr(seed).encode('utf-8')).hexdigest()
+
+    def fetch(self, key, render):
+        """Get the image of ``key``; if it is not cached, make it by
+        ``render()`` (returning the image) and store it.
+        """
+        image = self.get(key)
+        if image is None:
+            image = render()
+            self.set(key, image)
+            if isinstance(image, str):
+                image = image.encode('utf-8')
+
+        return image
+
+    def get(self, key):
+        path = os.path.join(self.path, key)
+        try:
+            with open(path, 'rb') as fp:
+                image = fp.read()
+
+            os.utime(path)  # mark as recently used
+            return image
+        except (IOError, OSError):
+            return None
+
+    def set(self, key, image):
+        if isinstance(image, str):
+            image = image.encode('utf-8')
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        fd, tmpfile = mkstemp(prefix='.', dir=self.path)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(image)
+        os.replace(tmpfile, os.path.join(self.path, key))
+
+        self.evict()
+
+    def evict(self):
+        if self.maxsize is None:
+            return
+
+        entries = []
+        for name in os.listdir(self.path):
+            if name.startswith('.'):  # temporary files
+                continue
+
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+            except OSError:
+                pass
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.maxsize:
+                break
+
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                os.remove(os.path.join(self.path, name))
@@ -25,12 +25,14 @@ from docutils.parsers.rst.roles import set_classes
 from docutils.statemachine import ViewList
 
 from blockdiag.utils.bootstrap import Application, create_fontmap
+from blockdiag.utils.rendercache import RenderCache
 from blockdiag.utils.rst.nodes import blockdiag as blockdiag_node
 
 directive_options_default = dict(format='PNG',
                                  antialias=False,
                                  fontpath=None,
                                  outputdir=None,
+                                 cachedir=None,
                                  nodoctype=False,
                                  noviewbox=False,
                                  inline_svg=False)
@@ -167,10 +169,13 @@ class BlockdiagDirective(BlockdiagDirectiveBase):
         if not isinstance(node, self.node_class):
             return results
 
-        try:
-            diagram = self.node2diagram(node)
-        except Exception as e:
-            raise self.warning(str(e))
+        if 'desctable' in node['options'] or figwidth == 'image':
+            try:
+                diagram = self.node2diagram(node)
+            except Exception as e:
+                raise self.warning(str(e))
+        else:
+            diagram = None  # built only if the image is not cached
 
         if 'desctable' in node['options']:
             results += self.description_tables(diagram)
@@ -233,37 +238,57 @@ class BlockdiagDirective(BlockdiagDirectiveBase):
 
         return drawer.pagesize()[0]
 
-    def node2image(self, node, diagram):
+    def node2image(self, node, diagram=None):
+        """Make an image node of the diagram.
+        The diagram is built from the node if ``diagram`` is None and the
+        image is neither generated nor cached yet.
+        """
         _format = self.global_options['format'].lower()
         if _format == 'svg' and self.global_options['inline_svg'] is True:
             return self.node2image_inline_svg(node, diagram)
 
         filename = self.image_filename(node)
-        fontmap = self.create_fontmap()
-        if hasattr(node, 'to_drawer'):
-            drawer = node.to_drawer(_format, filename, fontmap,
-                                    **self.global_options)
-        else:
-            drawer = self.processor.drawer.DiagramDraw(_format, diagram,
-                                                       filename,
-                                                       fontmap=fontmap,
-                                                       **self.global_options)
-
         if not os.path.isfile(filename):
-            drawer.draw()
-            drawer.save()
+            fontmap = self.create_fontmap()
+            cache = self.render_cache()
+            if cache:
+                key = self.render_cache_key(cache, node, fontmap)
+                image = cache.get(key)
+            else:
+                image = None
+
+            if image is not None:
+                with open(filename, 'wb') as fp:
+                    fp.write(image)
+            else:
+                drawer = self.node2drawer(node, diagram, _format, filename,
+                                          fontmap)
+                drawer.draw()
+                drawer.save()
+
+                if cache:
+                    with open(filename, 'rb') as fp:
+                        cache.set(key, fp.read())
 
         return nodes.image(uri=filename, **node['options'])
 
+    def node2drawer(self, node, diagram, _format, filename, fontmap):
+        try:
+            if hasattr(node, 'to_drawer'):
+                return node.to_drawer(_format, filename, fontmap,
+                                      **self.global_options)
+            elif diagram is None:
+                diagram = self.node2diagram(node)
+        except Exception as e:
+            raise self.warning(str(e))
+
+        return self.processor.drawer.DiagramDraw(_format, diagram, filename,
+                                                 fontmap=fontmap,
+                                                 **self.global_options)
+
     def node2image_inline_svg(self, node, diagram):
         fontmap = self.create_fontmap()
-        if hasattr(node, 'to_drawer'):
-            drawer = node.to_drawer('SVG', None, fontmap,
-                                    **self.global_options)
-        else:
-            drawer = self.processor.drawer.DiagramDraw('svg', diagram,
-                                                       None, fontmap=fontmap,
-                                                       **self.global_options)
+        drawer = self.node2drawer(node, diagram, 'svg', None, fontmap)
         drawer.draw()
 
         size = drawer.pagesize().resize(**node['options']).to_integer_point()
@@ -271,6 +296,22 @@ class BlockdiagDirective(BlockdiagDirectiveBase):
 
         return nodes.raw('', content, format='html')
 
+    def render_cache(self):
+        cachedir = self.global_options.get('cachedir')
+        if cachedir:
+            return RenderCache(cachedir)
+        else:
+            return None
+
+    def render_cache_key(self, cache, node, fontmap):
+        """Make a cache key of the image from the source of the node"""
+        options = dict(node['options'],
+                       antialias=self.global_options['antialias'],
+                       nodoctype=self.global_options['nodoctype'],
+                       noviewbox=self.global_options['noviewbox'])
+        return cache.key(node['code'], self.global_options['format'],
+                         options, fontmap, getattr(node, 'processor', None))
+
     def create_fontmap(self):
         Options = namedtuple('Options', 'font fontmap')
         fontpath = self.global_options['fontpath']
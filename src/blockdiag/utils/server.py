@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#  Copyright 2011 Takeshi KOMIYA
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import json
+import os
+import re
+import shutil
+import socket
+import socketserver
+from contextlib import redirect_stderr
+from tempfile import mkdtemp
+
+from blockdiag.utils.logging import warning
+
+CONNECT_TIMEOUT = 1  # seconds
+
+# options accepted in requests; True if the option takes a value.
+# The others are rejected because they read or write files on the server.
+RENDER_OPTIONS = {
+    '-a': False,
+    '-T': True,
+    '--nodoctype': False,
+    '--no-transparency': False,
+    '--shadow-filter': True,
+    '--size': True,
+}
+
+
+def parse_address(address):
+    """Parse "HOST:PORT", ":PORT" or "PORT" as TCP address (localhost by
+       default); other strings are paths of Unix domain sockets.
+    """
+    matched = re.match(r'^(?:([\w.-]*):)?(\d+)$', address)
+    if matched:
+        return (matched.group(1) or 'localhost', int(matched.group(2)))
+    else:
+        return address
+
+
+def is_loopback(host):
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, None)]
+    except socket.gaierror:
+        return False
+
+    return all(addr == '::1' or addr.startswith('127.') for addr in addresses)
+
+
+def connect(address):
+    if isinstance(address, tuple):
+        return socket.create_connection(address, CONNECT_TIMEOUT)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(address)
+        except Exception:
+            sock.close()
+            raise
+
+        return sock
+
+
+def preload():
+    from blockdiag import imagedraw, noderenderer
+    imagedraw.init_imagedrawers()
+    noderenderer.init_renderers()
+
+
+def check_args(args):
+    """Check that args consists of RENDER_OPTIONS only"""
+    args = iter(args)
+    for arg in args:
+        if arg not in RENDER_OPTIONS:
+            raise ValueError("option is not allowed: %s" % arg)
+        elif RENDER_OPTIONS[arg] and next(args, None) is None:
+            raise ValueError("%s option requires an argument" % arg)
+
+
+def render(app_class, args, cwd, source):
+    """Render a diagram in a worker process.
+       Relative paths in the diagram are resolved from cwd.
+       Returns a tuple of exit status, image and messages.
+    """
+    check_args(args)
+    if not os.path.isabs(cwd):
+        raise ValueError("cwd must be an absolute path: %s" % cwd)
+
+    image = b''
+    messages = io.StringIO()
+    tmpdir = mkdtemp()
+    try:
+        with redirect_stderr(messages):
+            output = os.path.join(tmpdir, 'output')
+
+            app = app_class()
+            app.code = source
+            app.basedir = cwd
+            status = app.run(list(args) + ['-o', output, '-'])
+            if isinstance(status, SystemExit):
+                status = status.code
+
+            if status == 0:
+                with open(output, 'rb') as fp:
+                    image = fp.read()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return status, image, messages.getvalue()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """A request is a line of JSON (args, cwd and source); the response is
+       a line of JSON (status, messages and length) followed by the image.
+       args are options in RENDER_OPTIONS only.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return  # connected only to check the server is running
+
+        try:
+            request = json.loads(line.decode('utf-8'))
+            future = self.server.pool.submit(render, self.server.app_class,
+                                             request['args'], request['cwd'],
+                                             request['source'])
+            status, image, messages = future.result()
+        except Exception as exc:
+            status, image, messages = -1, b'', 'ERROR: %s\n' % exc
+
+        header = dict(status=status, messages=messages, length=len(image))
+        self.wfile.write(json.dumps(header).encode('utf-8') + b'\n')
+        self.wfile.write(image)
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class ThreadingUnixStreamServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def make_server(app_class, address, pool):
+    """Make a server rendering diagrams with app_class in the pool"""
+    address = parse_address(address)
+    if isinstance(address, tuple):
+        if not is_loopback(address[0]):
+            warning("the server accepts requests from other hosts: %s",
+                    address[0])
+
+        server = ThreadingTCPServer(address, RequestHandler)
+    else:
+        if os.path.exists(address):
+            try:
+                connect(address).close()
+                msg = "server is already running: %s" % address
+                raise RuntimeError(msg)
+            except (IOError, OSError):
+                os.remove(address)  # stale socket
+
+        server = ThreadingUnixStreamServer(address, RequestHandler)
+        os.chmod(address, 0o600)
+
+    server.app_class = app_class
+    server.pool = pool
+    return server
+
+
+def serve(app_class, address, workers=None):
+    """Serve render requests until interrupted"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    preload()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        # start workers before the server runs threads
+        for future in [pool.submit(preload) for _ in range(workers)]:
+            future.result()
+
+        server = make_server(app_class, address, pool)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if server.address_family == getattr(socket, 'AF_UNIX', None):
+                os.remove(server.server_address)
+
+
+def request(address, args, cwd, source):
+    """Request the server to render a diagram.
+       Returns a tuple of exit status, image and messages,
+       or None if the server is not available.
+    """
+    try:
+        sock = connect(parse_address(address))
+    except (AttributeError, IOError, OSError):  # AF_UNIX is not available
+        return None
+
+    try:
+        with sock, sock.makefile('rwb') as fp:
+            sock.settimeout(None)
+            body = dict(args=args, cwd=cwd, source=source)
+            fp.write(json.dumps(body).encode('utf-8') + b'\n')
+            fp.flush()
+
+            header = json.loads(fp.readline().decode('utf-8'))
+            image = fp.read(header['length'])
+            if len(image) != header['length']:
+                return None
+
+            return header['status'], image, header['messages']
+    except (IOError, OSError, ValueError, KeyError):
+        return None